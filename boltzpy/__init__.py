@@ -41,5 +41,5 @@ from boltzpy.simulation import Simulation
 from boltzpy.species import Species
 from boltzpy.specimen import Specimen
 from boltzpy.svgrid import SVGrid
-from boltzpy.collisions import Collisions
+from boltzpy.collisions import Collisions, CollisionCache
 from boltzpy.data import Data
@@ -1,10 +1,15 @@
 
+import os
+import json
+import hashlib
 import numpy as np
-from scipy.sparse import csr_matrix
+from scipy.sparse import coo_matrix
 from time import time
+from concurrent.futures import ProcessPoolExecutor
 import h5py
 
 import boltzpy as bp
+import boltzpy.constants as bp_c
 
 
 class Collision(bp.BaseClass):
@@ -177,38 +182,38 @@ class Collisions(bp.BaseClass):
         of the respective collision in :attr:`relations`.
     """
     def __init__(self):
-        self.collisions = None
+        self.relations = None
+        self.weights = None
         return
 
     @property
-    def relations(self):
-        ret = [coll.relation for coll in self.collisions]
-        return np.array(ret, dtype=int)
-
-    @relations.setter
-    def relations(self, new_relations):
-        new_collisions = np.array(
-            [Collision(rel, 0.0) for rel in new_relations],
-            dtype=object)
-        if self.collisions is not None:
-            for (i, old_coll) in enumerate(self.collisions):
-                new_collisions[i].weight = old_coll.weight
-        self.collisions = new_collisions
+    def collisions(self):
+        """:obj:`~numpy.array` [:class:`Collision`] :
+        Array of :class:`Collision` objects,
+        created on demand from :attr:`relations` and :attr:`weights`.
 
-    @property
-    def weights(self):
-        ret = [coll.weight for coll in self.collisions]
-        return np.array(ret, dtype=float)
-
-    @weights.setter
-    def weights(self, new_weights):
-        new_collisions = np.array(
-            [Collision(np.zeros((4,), dtype=int), w) for w in new_weights],
-            dtype=object)
-        if self.collisions is not None:
-            for (i, old_coll) in enumerate(self.collisions):
-                new_collisions[i].relation = old_coll.relation
-        self.collisions = new_collisions
+        This is expensive for large collision sets
+        and only intended for plotting and small post-processing tasks.
+        """
+        if self.relations is None:
+            return None
+        collisions = np.empty(self.size, dtype=object)
+        for (i, (rel, weight)) in enumerate(zip(self.relations,
+                                                self.weights)):
+            collisions[i] = Collision(rel, weight)
+        return collisions
+
+    @collisions.setter
+    def collisions(self, new_collisions):
+        if new_collisions is None:
+            self.relations = None
+            self.weights = None
+            return
+        self.relations = np.array([coll.relation for coll in new_collisions],
+                                  dtype=int).reshape((-1, 4))
+        self.weights = np.array([coll.weight for coll in new_collisions],
+                                dtype=float)
+        return
 
     @property
     def size(self):
@@ -235,7 +240,9 @@ class Collisions(bp.BaseClass):
               scheme,
               svgrid,
               species,
-              apply_filter=True):
+              apply_filter=True,
+              use_cache=True,
+              workers=None):
         """Generates the :attr:`relations` and :attr:`weights`.
 
         Parameters
@@ -243,98 +250,150 @@ class Collisions(bp.BaseClass):
         scheme : :class:`Scheme`
         svgrid : :class:`SVGrid`
         species : :class:`Species`
+        apply_filter : :obj:`bool`, optional
+            If True, then redundant collisions are removed.
+        use_cache : :obj:`bool`, optional
+            If True, then the :class:`CollisionCache` is searched first
+            and newly generated collisions are added to it.
+        workers : :obj:`int`, optional
+            Number of processes used for the generation.
+            If None or 1, then the collisions are generated serially.
+            The result does not depend on the number of workers.
         """
         assert isinstance(scheme, bp.Scheme)
         assert isinstance(svgrid, bp.SVGrid)
         assert isinstance(species, bp.Species)
 
+        if use_cache:
+            cache = CollisionCache()
+            key = cache.fingerprint(scheme, svgrid, species, apply_filter)
+            cached_collisions = cache.load(key)
+            if cached_collisions is not None:
+                print('Loaded Collision Array from cache\n'
+                      'Total Number of Collisions = {n}\n'
+                      ''.format(n=cached_collisions.size))
+                self.relations = cached_collisions.relations
+                self.weights = cached_collisions.weights
+                return
+
         print('Generating Collision Array...')
         time_beg = time()
-        # collect collisions in the following lists
-        relations = []
-        weights = []
+        if scheme.Collisions_Generation == 'UniformComplete':
+            generator = complete
+        elif scheme.Collisions_Generation == 'UniformComplete_Vectorized':
+            generator = complete_vectorized
+        elif scheme.Collisions_Generation == 'Simple':
+            generator = simple
+        else:
+            msg = ('Unsupported Selection Scheme:'
+                   + '{}'.format(scheme.Collisions_Generation))
+            raise NotImplementedError(msg)
 
         """The velocities are named in the following way:
         1. v* and w* are velocities of the first/second specimen, respectively
         2. v0 or w0 denotes the velocity before the collision
            v1 or w1 denotes the velocity after the collision
         """
-        # Iterate over Specimen pairs
+        # Each task generates the collisions of a specimen pair
+        # for a contiguous range of v0 velocities.
+        # The tasks are ordered as in a serial run over all
+        # specimen pairs and v0
+        tasks = []
         for (idx_spc_v, grid_v) in enumerate(svgrid.vGrids):
-            index_offset_v = svgrid.index_range[idx_spc_v, 0]
-            mass_v = species.mass[idx_spc_v]
-            for (idx_spc_w, grid_w) in enumerate(svgrid.vGrids):
-                index_offset_w = svgrid.index_range[idx_spc_w, 0]
-                mass_w = species.mass[idx_spc_w]
-                # skip already computed combinations
-                if idx_spc_w < idx_spc_v:
-                    continue
-                # generate collisions between the specimen,
-                # depending on the collision model
-                if scheme.Collisions_Generation == 'UniformComplete':
-                    [new_rels, new_weights] = complete(
-                        mass_v,
-                        grid_v,
-                        mass_w,
-                        grid_w,
-                        idx_spc_v,
-                        idx_spc_w,
-                        index_offset_v,
-                        index_offset_w,
-                        svgrid,
-                        species)
-                    relations += new_rels
-                    weights += new_weights
-                elif scheme.Collisions_Generation == 'Simple':
-                    [new_rels, new_weights] = simple(
-                        mass_v,
-                        grid_v,
-                        mass_w,
-                        grid_w,
-                        idx_spc_v,
-                        idx_spc_w,
-                        index_offset_v,
-                        svgrid,
-                        species)
-                    relations += new_rels
-                    weights += new_weights
+            for idx_spc_w in range(idx_spc_v, species.size):
+                if workers is None or workers == 1:
+                    chunks = [(0, grid_v.size)]
                 else:
-                    msg = ('Unsupported Selection Scheme:'
-                           + '{}'.format(scheme.Collisions_Generation))
-                    raise NotImplementedError(msg)
-        self.relations = np.array(relations, dtype=int)
-        self.weights = np.array(weights, dtype=float)
+                    # use several chunks per worker, to balance the load
+                    n_chunks = min(grid_v.size, 4 * workers)
+                    bounds = np.linspace(0, grid_v.size, n_chunks + 1)
+                    bounds = bounds.astype(int)
+                    chunks = [(bounds[i], bounds[i + 1])
+                              for i in range(n_chunks)]
+                for v0_range in chunks:
+                    tasks.append((generator,
+                                  idx_spc_v,
+                                  idx_spc_w,
+                                  v0_range))
+
+        # collect collisions of each task in the following lists
+        relations = [np.zeros((0, 4), dtype=int)]
+        weights = [np.zeros((0,), dtype=float)]
+        if workers is None or workers == 1:
+            results = (_generate_task(task, svgrid, species)
+                       for task in tasks)
+        else:
+            assert isinstance(workers, int) and workers > 1
+            # svgrid and species are sent only once to each worker
+            pool = ProcessPoolExecutor(max_workers=workers,
+                                       initializer=_init_worker,
+                                       initargs=(svgrid, species))
+            with pool:
+                # map returns the results in the order of the tasks
+                results = list(pool.map(_generate_worker_task, tasks))
+        for [new_rels, new_weights] in results:
+            relations.append(np.array(new_rels, dtype=int).reshape((-1, 4)))
+            weights.append(np.array(new_weights, dtype=float))
+        self.relations = np.concatenate(relations)
+        self.weights = np.concatenate(weights)
         if apply_filter:
             # remove redundant collisions
             # intraspecies collisions are counted twice, since
             # both (v0, v1, w0, w1) and ( v0, w1, w0, v1) are counted
             # for some tests it is useful to keep these and filter later
-            self.collisions = filter_collisions(self.collisions)
+            indices = filter_collisions(self.relations)
+            self.relations = self.relations[indices]
+            self.weights = self.weights[indices]
         time_end = time()
         print('Time taken =  {t} seconds\n'
               'Total Number of Collisions = {n}\n'
               ''.format(t=round(time_end - time_beg, 3),
                         n=self.size))
         self.check_integrity()
+        if use_cache:
+            cache.save(key, self)
         return
 
-    def generate_collision_matrix(self, dt):
+    def generate_collision_matrix(self, dt=1.0, number_of_velocities=None):
+        """Generates the sparse collision matrix.
+
+        Each column belongs to a collision and contains its weight,
+        with a negative sign for the pre-collision velocities.
+        This is necessary for stability,
+        as v[i]*v[j] - v[k]*v[l] is used as collision term
+        => v'[*] = ... - X*u[*].
+
+        The matrix is assembled directly in sparse form,
+        without a dense intermediate.
+        The time step is applied afterwards as a scalar factor.
+
+        Parameters
+        ----------
+        dt : :obj:`float`, optional
+            Time step, the weights are multiplied with.
+        number_of_velocities : :obj:`int`, optional
+            Number of rows, i.e. the size of the complete velocity grid.
+            Defaults to the largest velocity index in :attr:`relations`.
+
+        Returns
+        -------
+        col_mat : :obj:`~scipy.sparse.csr_matrix`
+        """
         # Size of complete velocity grid
-        rows = np.max(self.relations.flatten()) + 1
+        if number_of_velocities is None:
+            rows = np.max(self.relations) + 1
+        else:
+            rows = number_of_velocities
         # Number of different collisions
         columns = self.size
-        col_matrix = np.zeros(shape=(rows, columns),
-                              dtype=float)
-        for [i_col, col] in enumerate(self.relations):
-            """Negative sign for pre-collision velocities
-            => necessary for stability
-               v[i]*v[j] - v[k]*v[l] is used as collision term
-               => v'[*] = ... - X*u[*]"""
-            # Todo multiplication with dt -> move out of matrix
-            col_weight = dt * self.weights[i_col]
-            col_matrix[col, i_col] = [-1, 1, -1, 1]
-            col_matrix[col, i_col] *= col_weight
-        col_mat = csr_matrix(col_matrix)
+        row_indices = self.relations.flatten()
+        column_indices = np.repeat(np.arange(columns), 4)
+        signs = np.array([-1, 1, -1, 1], dtype=float)
+        values = (signs[np.newaxis, :] * self.weights[:, np.newaxis]).flatten()
+        col_mat = coo_matrix((values, (row_indices, column_indices)),
+                             shape=(rows, columns)).tocsr()
+        if dt != 1:
+            col_mat.data *= dt
         return col_mat
 
     @property
@@ -346,10 +405,111 @@ class Collisions(bp.BaseClass):
         if self.relations is None:
             return None
         else:
-            mat = self.generate_collision_matrix(1)
-            rank = np.linalg.matrix_rank(mat.toarray())
-            size_of_velocity_space = mat.shape[0]
-            return size_of_velocity_space - rank
+            return self.collision_invariants().shape[0]
+
+    def collision_invariants(self, number_of_velocities=None):
+        """Computes a basis of the collision invariants.
+
+        The collision invariants are the null space
+        of the transposed collision matrix.
+        Instead of a singular value decomposition of the
+        (velocities x collisions) matrix,
+        this uses the eigenvalue decomposition
+        of the much smaller (velocities x velocities) Gram matrix,
+        which is computed in sparse form.
+
+        Parameters
+        ----------
+        number_of_velocities : :obj:`int`, optional
+            Size of the complete velocity grid,
+            see :meth:`generate_collision_matrix`.
+
+        Returns
+        -------
+        basis : :obj:`~numpy.array` [:obj:`float`]
+            Orthonormal basis of the collision invariants,
+            one invariant per row.
+        """
+        assert self.relations is not None
+        mat = self.generate_collision_matrix(
+            number_of_velocities=number_of_velocities)
+        gram = mat.dot(mat.T).toarray()
+        [eigenvalues, eigenvectors] = np.linalg.eigh(gram)
+        # eigenvalues are squared singular values,
+        # thus the tolerance is the square root of np.linalg.matrix_rank's
+        tolerance = (np.max(eigenvalues, initial=0.0)
+                     * gram.shape[0] * np.finfo(float).eps)
+        is_invariant = eigenvalues <= tolerance
+        return eigenvectors[:, is_invariant].T
+
+    def reduce(self, svgrid, mode="area", **kwargs):
+        """Reduces the collisions to a subset,
+        that keeps the collision invariants.
+
+        The collisions are grouped by the species of the colliding
+        particles and their keys (see :func:`get_keys`).
+        The first collision of each group is kept.
+        Afterwards, removed collisions are added back,
+        until the number of collision invariants
+        equals the one of the complete set.
+        The total weight of each group is split equally
+        among its remaining collisions.
+
+        Parameters
+        ----------
+        svgrid : :class:`SVGrid`
+        mode : :obj:`str`, optional
+            Either "index", "area" or "angle".
+        """
+        assert self.is_set_up
+        print('Reducing Collision Array...')
+        time_beg = time()
+        size = svgrid.size
+        number_of_invariants = self.collision_invariants(size).shape[0]
+        # group collisions by species and key
+        species = np.searchsorted(svgrid.index_range[:, 1],
+                                  self.relations[:, [0, 2]],
+                                  side="right")
+        keys = np.hstack([species,
+                          get_keys(self.relations, svgrid, mode, **kwargs)])
+        [_, first_indices, groups] = np.unique(keys,
+                                               axis=0,
+                                               return_index=True,
+                                               return_inverse=True)
+        groups = groups.reshape(-1)
+        is_kept = np.zeros(self.size, dtype=bool)
+        is_kept[first_indices] = True
+        # add collisions back, until all additional invariants are removed
+        reduced = Collisions()
+        reduced.relations = self.relations[is_kept]
+        reduced.weights = self.weights[is_kept]
+        basis = reduced.collision_invariants(size)
+        mat = self.generate_collision_matrix(number_of_velocities=size)
+        while basis.shape[0] > number_of_invariants:
+            # non conserved part of each (normalized) collision
+            violation = mat.T.dot(basis.T) / self.weights[:, np.newaxis]
+            violation[is_kept] = 0
+            is_violated = np.max(np.abs(violation), axis=1) > 1e-8
+            assert np.any(is_violated)
+            idx = np.argmax(is_violated)
+            is_kept[idx] = True
+            # remove the violated direction from the basis
+            [_, _, vt] = np.linalg.svd(violation[np.newaxis, idx])
+            basis = vt[1:].dot(basis)
+        # redistribute the weights of each group
+        group_weights = np.bincount(groups, weights=self.weights)
+        group_sizes = np.bincount(groups[is_kept],
+                                  minlength=group_weights.size)
+        self.relations = self.relations[is_kept]
+        self.weights = (group_weights / group_sizes)[groups[is_kept]]
+        assert self.collision_invariants(size).shape[0] == number_of_invariants
+        time_end = time()
+        print('Time taken =  {t} seconds\n'
+              'Reduced Number of Collisions = {n}\n'
+              ''.format(t=round(time_end - time_beg, 3),
+                        n=self.size))
+        self.check_integrity()
+        return
 
     #####################################
     #           Serialization           #
@@ -385,13 +545,16 @@ class Collisions(bp.BaseClass):
         self.check_integrity()
         return self
 
-    def save(self, hdf5_group):
+    def save(self, hdf5_group, verify=True):
         """Write the main parameters of the :obj:`Collisions` instance
         into the HDF5 group.
 
         Parameters
         ----------
         hdf5_group : :obj:`h5py.Group <h5py:Group>`
+        verify : :obj:`bool`, optional
+            If True, then the group is loaded again
+            and compared to the instance.
         """
         # Todo Create hashes of parameters as attribute -> save & compare
         assert isinstance(hdf5_group, h5py.Group)
@@ -408,16 +571,34 @@ class Collisions(bp.BaseClass):
         if self.weights is not None:
             hdf5_group["Weights"] = self.weights
 
-        # check that the class can be reconstructed from the save
-        other = Collisions.load(hdf5_group)
-        assert self == other
+        if verify:
+            # check that the class can be reconstructed from the save
+            other = Collisions.load(hdf5_group)
+            assert self == other
         return
 
     #####################################
     #           Verification            #
     #####################################
-    def check_integrity(self, context=None):
-        """Sanity Check"""
+    def check_integrity(self, context=None, level=None):
+        """Sanity Check
+
+        All checks are vectorized.
+
+        Parameters
+        ----------
+        context : :class:`Simulation`, optional
+            If given, then the velocity indices and their species
+            are checked as well.
+            Necessary for the "full" level.
+        level : :obj:`str`, optional
+            Either "basic" or "full",
+            see :const:`~boltzpy.constants.SUPP_COLLISION_CHECK_LEVELS`.
+            Defaults to :const:`~boltzpy.constants.COLLISION_CHECK_LEVEL`.
+        """
+        if level is None:
+            level = bp_c.COLLISION_CHECK_LEVEL
+        assert level in bp_c.SUPP_COLLISION_CHECK_LEVELS
         if context is not None:
             assert isinstance(context, bp.Simulation)
         if self.relations is not None or self.weights is not None:
@@ -429,24 +610,263 @@ class Collisions(bp.BaseClass):
             assert self.relations.ndim == 2
             assert self.weights.ndim == 1
             assert self.relations.shape == (self.weights.size, 4)
-            for col in self.relations:
-                assert col[0] < col[1]
-                assert col[0] < col[2]
-                if context is not None:
-                    sv = context.sv
-                    di_0 = (sv.iMG[col[1]] - sv.iMG[col[0]])
-                    di_1 = (sv.iMG[col[3]] - sv.iMG[col[2]])
-                    assert all(np.array(di_1 + di_0) == 0)
-                    s = [sv.get_specimen(v_col) for v_col in col]
-                    assert s[0] == s[1] and s[2] == s[3]
-                    # Todo add conserves energy check
-            assert all(w > 0 for w in self.weights.flatten())
+            assert np.all(self.relations[:, 0] < self.relations[:, 1])
+            assert np.all(self.relations[:, 0] < self.relations[:, 2])
+            assert np.all(self.weights > 0)
+            if level == "full":
+                assert context is not None
+            if context is not None:
+                sv = context.sv
+                assert np.all(self.relations >= 0)
+                assert np.all(self.relations < sv.size)
+                # species of each velocity
+                spc = np.searchsorted(sv.index_range[:, 1],
+                                      self.relations,
+                                      side="right")
+                assert np.array_equal(spc[:, 0], spc[:, 1])
+                assert np.array_equal(spc[:, 2], spc[:, 3])
+            if level == "full":
+                mass = np.array(context.s.mass)[spc[:, [0, 2]]]
+                [v0, v1, w0, w1] = [sv.iMG[self.relations[:, i]]
+                                    for i in range(4)]
+                # Invariance of momentum
+                momentum = (mass[:, 0, np.newaxis] * (v1 - v0)
+                            + mass[:, 1, np.newaxis] * (w1 - w0))
+                assert np.all(momentum == 0)
+                # Invariance of energy
+                energy = (mass[:, 0] * np.sum(v1**2 - v0**2, axis=1)
+                          + mass[:, 1] * np.sum(w1**2 - w0**2, axis=1))
+                assert np.all(energy == 0)
+        return
+
+
+class CollisionCache:
+    """Disk-backed cache of generated :class:`Collisions`.
+
+    The collisions depend only on the masses and collision rates
+    of the :class:`Species`, the shapes and spacings
+    of the :class:`SVGrid` and the generation scheme.
+    A hash of exactly these parameters (see :meth:`fingerprint`)
+    is used as the key of a cache entry.
+    Each entry is stored as a separate HDF5 file in :attr:`directory`.
+
+    If the total size of all entries exceeds :attr:`max_size`,
+    then the least recently used entries are removed.
+
+    Parameters
+    ----------
+    directory : :obj:`str`, optional
+        Defaults to
+        :const:`~boltzpy.constants.COLLISION_CACHE_DIRECTORY`.
+    max_size : :obj:`int`, optional
+        Maximum total size of the cache in bytes.
+        Defaults to
+        :const:`~boltzpy.constants.COLLISION_CACHE_MAX_SIZE`.
+    """
+    def __init__(self, directory=None, max_size=None):
+        if directory is None:
+            directory = bp_c.COLLISION_CACHE_DIRECTORY
+        if max_size is None:
+            max_size = bp_c.COLLISION_CACHE_MAX_SIZE
+        assert isinstance(directory, str)
+        assert isinstance(max_size, int) and max_size >= 0
+        self.directory = directory
+        self.max_size = max_size
+        return
+
+    #: :obj:`int` : Increase this, if the file layout of the entries changes.
+    VERSION = 1
+
+    @staticmethod
+    def fingerprint(scheme,
+                    svgrid,
+                    species,
+                    apply_filter=True):
+        """Compute the key of the collisions,
+        that are generated by :meth:`Collisions.setup`
+        with the given parameters.
+
+        Parameters
+        ----------
+        scheme : :class:`Scheme`
+        svgrid : :class:`SVGrid`
+        species : :class:`Species`
+        apply_filter : :obj:`bool`, optional
+
+        Returns
+        -------
+        key : :obj:`str`
+        """
+        params = {"version": CollisionCache.VERSION,
+                  "mass": species.mass.tolist(),
+                  "collision_rates": species.collision_rates.tolist(),
+                  "ndim": svgrid.ndim,
+                  "shapes": [list(shape) for shape in svgrid.shapes],
+                  "spacings": list(svgrid.spacings),
+                  "Collisions_Generation": scheme.Collisions_Generation,
+                  "apply_filter": apply_filter}
+        params = json.dumps(params, sort_keys=True)
+        return hashlib.sha256(params.encode()).hexdigest()
+
+    def file_address(self, key):
+        """:obj:`str` : Full path of the cache entry of the given key."""
+        return os.path.join(self.directory, key + ".hdf5")
+
+    @property
+    def entries(self):
+        """:obj:`list` [:obj:`str`] :
+        Full paths of all cache entries,
+        ordered from the least to the most recently used.
+        Temporary files of unfinished saves are no entries."""
+        if not os.path.isdir(self.directory):
+            return []
+        entries = []
+        for file_name in os.listdir(self.directory):
+            if not file_name.endswith(".hdf5"):
+                continue
+            entry = os.path.join(self.directory, file_name)
+            try:
+                entries.append((os.path.getmtime(entry), entry))
+            except FileNotFoundError:
+                # removed by a concurrent simulation
+                continue
+        return [entry for (_, entry) in sorted(entries)]
+
+    @property
+    def size(self):
+        """:obj:`int` : Total size of all cache entries in bytes."""
+        return sum(size for (_, size) in self._entry_sizes())
+
+    def _entry_sizes(self):
+        sizes = []
+        for entry in self.entries:
+            try:
+                sizes.append((entry, os.path.getsize(entry)))
+            except FileNotFoundError:
+                # removed by a concurrent simulation
+                continue
+        return sizes
+
+    def load(self, key):
+        """Return the cached :class:`Collisions` of the given key,
+        or None, if there is no such entry.
+
+        Parameters
+        ----------
+        key : :obj:`str`
+
+        Returns
+        -------
+        collisions : :class:`Collisions` or :obj:`None`
+        """
+        file_address = self.file_address(key)
+        if not os.path.exists(file_address):
+            return None
+        try:
+            with h5py.File(file_address, mode="r") as file:
+                collisions = Collisions.load(file)
+        except (OSError, KeyError, AssertionError):
+            # remove broken entries
+            os.remove(file_address)
+            return None
+        # mark entry as recently used
+        os.utime(file_address)
+        return collisions
+
+    def save(self, key, collisions):
+        """Store the :class:`Collisions` as the entry of the given key
+        and remove the least recently used entries, if necessary.
+
+        Parameters
+        ----------
+        key : :obj:`str`
+        collisions : :class:`Collisions`
+        """
+        assert isinstance(collisions, Collisions)
+        os.makedirs(self.directory, exist_ok=True)
+        file_address = self.file_address(key)
+        # write into a temporary file first,
+        # concurrent simulations must never read incomplete entries
+        tmp_address = "{}.{}.tmp".format(file_address, os.getpid())
+        with h5py.File(tmp_address, mode="w") as file:
+            collisions.save(file, verify=False)
+        os.replace(tmp_address, file_address)
+        self.evict()
+        return
+
+    def evict(self):
+        """Remove the least recently used entries,
+        until the total size is at most :attr:`max_size`.
+
+        Concurrent simulations may remove entries as well,
+        missing entries are skipped.
+        """
+        entry_sizes = self._entry_sizes()
+        total_size = sum(size for (_, size) in entry_sizes)
+        for (entry, size) in entry_sizes:
+            if total_size <= self.max_size:
+                break
+            total_size -= size
+            try:
+                os.remove(entry)
+            except FileNotFoundError:
+                continue
         return
 
 
 ##############################################
 #       Collision Generation Functions       #
 ##############################################
+#: :obj:`dict` : Parameters of the worker processes
+#: of :meth:`Collisions.setup`, see :func:`_init_worker`.
+_WORKER_PARAMS = dict()
+
+
+def _init_worker(svgrid, species):
+    """Stores the parameters, that are shared by all tasks,
+    once in each worker process."""
+    _WORKER_PARAMS["svgrid"] = svgrid
+    _WORKER_PARAMS["species"] = species
+    return
+
+
+def _generate_worker_task(task):
+    """Executes :func:`_generate_task` in a worker process,
+    using the parameters of :func:`_init_worker`."""
+    return _generate_task(task,
+                          _WORKER_PARAMS["svgrid"],
+                          _WORKER_PARAMS["species"])
+
+
+def _generate_task(task, svgrid, species):
+    """Generates the collisions of a single task of
+    :meth:`Collisions.setup`.
+
+    Module level function, such that it can be sent to worker processes.
+
+    Parameters
+    ----------
+    task : :obj:`tuple`
+        Contains the generation function,
+        the indices of both specimen and the range of v0.
+    svgrid : :class:`SVGrid`
+    species : :class:`Species`
+    """
+    (generator, idx_spc_v, idx_spc_w, v0_range) = task
+    args = [species.mass[idx_spc_v],
+            svgrid.vGrids[idx_spc_v],
+            species.mass[idx_spc_w],
+            svgrid.vGrids[idx_spc_w],
+            idx_spc_v,
+            idx_spc_w,
+            svgrid.index_range[idx_spc_v, 0]]
+    # simple() does not use the index offset of w
+    if generator is not simple:
+        args.append(svgrid.index_range[idx_spc_w, 0])
+    args += [svgrid, species]
+    return generator(*args, v0_range=v0_range)
+
+
 def complete(mass_v,
              grid_v,
              mass_w,
@@ -456,17 +876,23 @@ def complete(mass_v,
              index_offset_v,
              index_offset_w,
              svgrid,
-             species):
+             species,
+             v0_range=None):
     """Generate all possible, non-useless collisions.
 
     Iterates over all possible velocity combinations
     and checks whether they are proper collisions.
 
-    All proper collisions are stored in the relations list."""
+    All proper collisions are stored in the relations list.
+    If v0_range = (begin, end) is given,
+    then only collisions with begin <= loc_v0 < end are generated."""
     relations = []
     weights = []
+    if v0_range is None:
+        v0_range = (0, grid_v.size)
     # Todo only works if spacing is dividable by mass_w
-    for (loc_v0, v0) in enumerate(grid_v.iG):
+    for loc_v0 in range(*v0_range):
+        v0 = grid_v.iG[loc_v0]
         # global index in self.iMG
         index_v0 = index_offset_v + loc_v0
         assert np.all(v0 == svgrid.iMG[index_v0])
@@ -509,6 +935,91 @@ def complete(mass_v,
     return [relations, weights]
 
 
+def complete_vectorized(mass_v,
+                        grid_v,
+                        mass_w,
+                        grid_w,
+                        idx_spc_v,
+                        idx_spc_w,
+                        index_offset_v,
+                        index_offset_w,
+                        svgrid,
+                        species,
+                        v0_range=None):
+    """Generate all possible, non-useless collisions.
+
+    This is a vectorized version of :func:`complete`.
+    For each v0 all candidates (v1, w0) are generated at once,
+    w1 is computed by the momentum invariance
+    and the conditions of :meth:`Collision.is_collision`
+    and :meth:`Collision.is_effective_collision`
+    are checked as array masks.
+
+    The collisions are returned in the same order as in :func:`complete`.
+    """
+    relations = []
+    weights = []
+    iG_v = grid_v.iG
+    iG_w = grid_w.iG
+    assert np.all(iG_v == svgrid.iMG[index_offset_v:
+                                     index_offset_v + grid_v.size])
+    assert np.all(iG_w == svgrid.iMG[index_offset_w:
+                                     index_offset_w + grid_w.size])
+    # energies (in multiples of delta**2) of all velocities
+    energy_v = mass_v * np.sum(iG_v ** 2, axis=1)
+    energy_w = mass_w * np.sum(iG_w ** 2, axis=1)
+    weight = species.collision_rates[idx_spc_v, idx_spc_w]
+    loc_w0 = np.arange(grid_w.size)
+    if v0_range is None:
+        v0_range = (0, grid_v.size)
+    for loc_v0 in range(*v0_range):
+        # we choose idx_v0 < idx_v1 to ignore v=(a, a, * , *)
+        # and ignore repeating collisions
+        loc_v1 = np.arange(loc_v0 + 1, grid_v.size)
+        # calculate Velocity (index) difference
+        diff_v = iG_v[loc_v1] - iG_v[loc_v0]
+        # Todo only works if spacing is dividable by mass_w
+        assert np.all((diff_v * mass_v) % mass_w == 0)
+        diff_w = -diff_v * mass_v // mass_w
+        # Calculate w1 for all (v1, w0), using the momentum invariance
+        # v1 is the outer and w0 is the inner loop, as in complete()
+        w1 = iG_w[np.newaxis, :, :] + diff_w[:, np.newaxis, :]
+        w1 = w1.reshape((-1, svgrid.ndim))
+        cand_v1 = np.repeat(loc_v1, grid_w.size)
+        cand_w0 = np.tile(loc_w0, loc_v1.size)
+        # find the local index of w1, if its in the grid
+        cand_w1 = grid_w.get_indices(w1)
+        is_accepted = cand_w1 >= 0
+        # Invariance of energy
+        is_accepted[is_accepted] = (
+            energy_v[loc_v0] + energy_w[cand_w0[is_accepted]]
+            == energy_v[cand_v1[is_accepted]]
+            + energy_w[cand_w1[is_accepted]])
+        # use global indices in svgrid.iMG
+        index_v0 = index_offset_v + loc_v0
+        index_v1 = index_offset_v + cand_v1[is_accepted]
+        index_w0 = index_offset_w + cand_w0[is_accepted]
+        index_w1 = index_offset_w + cand_w1[is_accepted]
+        # Ignore collisions that were already found
+        is_effective = np.logical_and(index_w0 >= index_v0,
+                                      index_w1 >= index_v0)
+        # Ignore v=(X,b,b,X) for same species
+        # as such collisions have no effect
+        is_effective &= ~np.logical_and(index_v1 == index_w0,
+                                        index_w1 == index_v0)
+        new_rels = np.zeros((np.count_nonzero(is_effective), 4), dtype=int)
+        new_rels[:, 0] = index_v0
+        new_rels[:, 1] = index_v1[is_effective]
+        new_rels[:, 2] = index_w0[is_effective]
+        new_rels[:, 3] = index_w1[is_effective]
+        relations.append(new_rels)
+        weights.append(np.full(new_rels.shape[0], weight, dtype=float))
+    relations = np.concatenate([np.zeros((0, 4), dtype=int)] + relations)
+    weights = np.concatenate([np.zeros((0,), dtype=float)] + weights)
+    assert relations.shape[0] == weights.size
+    return [relations, weights]
+
+
 def simple(mass_v,
              grid_v,
              mass_w,
@@ -517,19 +1028,25 @@ def simple(mass_v,
              idx_spc_w,
              index_offset_v,
              svgrid,
-             species):
+             species,
+             v0_range=None):
     """Generate some possible, non-useless collisions.
 
     Iterates over possible velocity combinations in the directions / with the angles given in angles
     and checks whether they are proper collisions.
 
-    All proper collisions are stored in the relations list."""
+    All proper collisions are stored in the relations list.
+    If v0_range = (begin, end) is given,
+    then only collisions with begin <= loc_v0 < end are generated."""
     angles = np.array([[1, -1], [1, 0], [1, 1], [0, 1]])    # effectively checks [[1, 0], [1, 1], [0, 1], [-1, 1],
                                                                                 # [-1, 0], [-1, -1], [0, -1], [1, -1]]
     relations = []
     weights = []
+    if v0_range is None:
+        v0_range = (0, grid_v.size)
     # Todo only works if spacing is dividable by 2*mass_w
-    for (loc_v0, v0) in enumerate(grid_v.iG):
+    for loc_v0 in range(*v0_range):
+        v0 = grid_v.iG[loc_v0]
         # global index in self.iMG
         index_v0 = index_offset_v + loc_v0
         assert np.all(v0 == svgrid.iMG[index_v0])
@@ -643,34 +1160,122 @@ def plot(svgrid,
     return plot_object
 
 
-def group_collisions(collisions,
+def get_keys(relations,
+             svgrid=None,
+             mode="index",
+             **kwargs):
+    """Computes the sorting keys of all collisions at once.
+
+    This is the array-level equivalent of
+    :meth:`Collision.get_key_function`.
+
+    Parameters
+    ----------
+    relations : :obj:`~numpy.array` [:obj:`int`]
+        Collision relations, of shape (N, 4).
+    svgrid : :class:`SVGrid`, optional
+        Necessary for the "area" and "angle" modes.
+    mode : :obj:`str`, optional
+        Either "index", "area" or "angle".
+
+    Returns
+    -------
+    keys : :obj:`~numpy.array`
+        The keys of the collisions, one row per collision.
+    """
+    relations = np.array(relations, dtype=int).reshape((-1, 4))
+    if mode == "index":
+        return np.sort(relations, axis=1)
+    elif mode == "area":
+        assert svgrid is not None
+        return key_area(relations, svgrid)
+    elif mode == "angle":
+        assert svgrid is not None
+        return key_angle(relations, svgrid, **kwargs)
+    else:
+        msg = ('Unsupported Parameter:\n\t'
+               'mode = ' + '{}'.format(mode))
+        raise NotImplementedError(msg)
+
+
+def key_area(relations, svgrid):
+    """Computes the area and circumference of all collisions,
+    see :meth:`Collision.key_area`."""
+    positions = svgrid.iMG[relations]
+    [v0, v1, w0, w1] = [positions[:, i] for i in range(4)]
+
+    def norm(vectors):
+        # the cross product of 2D vectors is a scalar
+        if vectors.ndim == 1:
+            return np.abs(vectors)
+        return np.linalg.norm(vectors, axis=-1)
+
+    area_1 = norm(np.cross(v1 - v0, w1 - v0))
+    area_2 = norm(np.cross(w1 - w0, w1 - v0))
+    area = 0.5 * (area_1 + area_2)
+    circumference = (norm(v1 - v0)
+                     + norm(w1 - w0)
+                     + 2 * norm(v0 - w1))
+    return np.stack([area, circumference], axis=1)
+
+
+def key_angle(relations, svgrid, merge_similar_angles=True):
+    """Computes the reduced direction of all collisions,
+    see :meth:`Collision.key_angle`."""
+    positions = svgrid.iMG[relations]
+    dv = positions[:, 1] - positions[:, 0]
+    angle = dv // np.gcd.reduce(dv, axis=1)[:, np.newaxis]
+    if merge_similar_angles:
+        angle = np.sort(np.abs(angle), axis=1)
+    return angle
+
+
+def group_collisions(relations,
                      svgrid=None,
                      mode="index",
                      **kwargs):
-    get_key = Collision.get_key_function(mode=mode,
-                                         svgrid=svgrid,
-                                         **kwargs)
+    """Groups the collisions by their keys, see :func:`get_keys`.
+
+    Returns
+    -------
+    grouped_collisions : :obj:`dict`
+        Maps each key (as a :obj:`tuple`) to the
+        :obj:`~numpy.array` of the indices of its collisions.
+        The keys are in order of their first occurrence.
+    """
+    keys = get_keys(relations, svgrid, mode, **kwargs)
+    if keys.shape[0] == 0:
+        return dict()
+    [unique_keys, first_indices, inverse] = np.unique(keys,
+                                                      axis=0,
+                                                      return_index=True,
+                                                      return_inverse=True)
+    inverse = inverse.reshape(-1)
+    order = np.argsort(inverse, kind="stable")
+    groups = np.split(order, np.cumsum(np.bincount(inverse))[:-1])
     grouped_collisions = dict()
-    for coll in collisions:
-        key = get_key(coll)
-        if key in grouped_collisions.keys():
-            grouped_collisions[key].append(coll)
-        else:
-            grouped_collisions[key] = [coll]
+    for group_idx in np.argsort(first_indices):
+        key = tuple(unique_keys[group_idx].tolist())
+        grouped_collisions[key] = groups[group_idx]
     return grouped_collisions
 
 
-def filter_collisions(collisions):
-    grouped_collisions = group_collisions(collisions,
-                                          mode="index")
-    filtered_collisions = [group[0] for group in grouped_collisions.values()]
-    return np.array(filtered_collisions, dtype=object)
+def filter_collisions(relations):
+    """Returns the indices of the first occurrence
+    of each collision, in their original order.
+    Collisions are equal, if they use the same velocities."""
+    keys = get_keys(relations, mode="index")
+    [_, first_indices] = np.unique(keys, axis=0, return_index=True)
+    return np.sort(first_indices)
 
 
-def sort_collisions(collisions,
+def sort_collisions(relations,
                     svgrid=None,
-                    mode='index'):
-    get_key = Collision.get_key_function(mode=mode,
-                                         svgrid=svgrid)
-    sorted_list = sorted(collisions, key=get_key)
-    return np.array(sorted_list, dtype=object)
+                    mode='index',
+                    **kwargs):
+    """Returns the indices that sort the collisions by their keys.
+    The sort is stable and the first column of the keys is the
+    primary sorting key."""
+    keys = get_keys(relations, svgrid, mode, **kwargs)
+    # np.lexsort uses the last key as the primary one
+    return np.lexsort(keys.T[::-1])
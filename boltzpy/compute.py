@@ -6,7 +6,6 @@ r""""..todo::
         * replace tG, and t_w by sparse matrix,
           such that transport is simple multiplication?
     - Properly implement computation( switches for Orders, vectorized))
-    - Implement Operator Splitting of Order 2 (easy)
     - Implement complex Geometries for P-Grid:
 
         * Each P-Grid Point has a list of Pointers to its Neighbours
@@ -57,7 +56,13 @@ r""""..todo::
     - implement p-local time-adaptive scheme?
         * split collision in multiple collision steps, to keep stability
 """
+import os
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
+from scipy.sparse import csr_matrix
+
+import boltzpy.constants as bp_c
+import boltzpy.jit as bp_jit
 
 
 ##################################
@@ -73,6 +78,112 @@ def operator_splitting(data, func_transport, func_collision):
     return
 
 
+def strang_splitting(data, func_transport, func_collision):
+    """Executes a single time step, using second order splitting.
+
+    A half transport step is executed before and after
+    the collision step.
+    The transport operator of data must be set up for
+    the half time step (see data.transport_dt)."""
+    func_transport(data)
+    func_collision(data)
+    func_transport(data)
+    assert np.all(data.state >= 0)
+    data.t += 1
+    return
+
+
+def adaptive_time_step(data, func_transport, func_collision, t_max):
+    """Executes a single time step of adaptive size.
+
+    The step size is a multiple of the base time step
+    (see :meth:`Data.set_step_size`).
+    It is bounded by the CFL condition and by t_max,
+    such that the output times are met exactly.
+
+    The collision step uses Heun's method.
+    The difference to the embedded Euler step estimates the error.
+    If the error exceeds data.tolerance, or the state becomes negative,
+    the step is repeated with a smaller step size.
+    The base time step is never rejected,
+    but uses the Euler step, if the error is too large.
+    After each step a new step size is proposed,
+    based on the error estimate."""
+    initial_state = np.copy(data.state)
+    while True:
+        step_size = min(data.proposed_step_size,
+                        data.max_step_size,
+                        t_max - data.t)
+        data.set_step_size(step_size)
+        func_transport(data)
+        [error, euler_state] = heun_scheme(data, func_collision)
+        if error > 1 and step_size == 1:
+            data.state[...] = euler_state
+        if data.operator_splitting == "SecondOrder":
+            func_transport(data)
+        # propose a new step size, Heun's method is of second order
+        if error == 0:
+            factor = 2
+        else:
+            factor = min(2, max(0.5, 0.9 * (1 / error) ** 0.5))
+        data.proposed_step_size = max(int(step_size * factor), 1)
+        # accept step
+        if error <= 1 or step_size == 1:
+            break
+        # reject step
+        data.state[...] = initial_state
+    assert np.all(data.state >= 0)
+    data.t += step_size
+    return
+
+
+def heun_scheme(data, func_collision):
+    """Executes a single collision step of Heun's method.
+
+    Heun's method is the mean of the initial state
+    and two consecutive Euler steps.
+
+    Returns
+    -------
+    error : :obj:`float`
+        The difference between Heun and Euler step,
+        relative to data.tolerance and the maximum of the state.
+        Steps with negative intermediate results are unstable
+        and have an infinite error.
+    euler_state : :obj:`~numpy.array` [:obj:`float`]
+        The result of the (first order) Euler step.
+    """
+    initial_state = np.copy(data.state)
+    func_collision(data)
+    euler_state = np.copy(data.state)
+    func_collision(data)
+    is_stable = np.all(data.state >= 0) and np.all(euler_state >= 0)
+    data.state += initial_state
+    data.state /= 2
+    if not is_stable:
+        return [np.inf, euler_state]
+    # mixed absolute and relative error of each component
+    scale = data.tolerance * (np.abs(data.state)
+                              + 1e-3 * np.max(np.abs(data.state)))
+    if not np.any(scale > 0):
+        return [0.0, euler_state]
+    error = np.max(np.abs(data.state - euler_state)[scale > 0]
+                   / scale[scale > 0])
+    return [error, euler_state]
+
+
+def relative_change(old_state, new_state):
+    """Returns the maximum change between both states,
+    relative to the maximum of the old state.
+
+    Used to detect steady states."""
+    scale = np.max(np.abs(old_state))
+    change = np.max(np.abs(new_state - old_state))
+    if scale == 0:
+        return 0.0 if change == 0 else np.inf
+    return change / scale
+
+
 #################################
 #           Transport           #
 #################################
@@ -178,22 +289,347 @@ def no_transport(data, affected_points):
     return
 
 
+#################################
+#       Transport Operators     #
+#################################
+def apply_transport_operator(data):
+    """Computes data.result from data.state, by applying the
+    precomputed transport operator (see :meth:`Geometry.transport_operator`).
+    """
+    result = data.result.reshape(-1)
+    np.add(data.transport_mat.dot(data.state.reshape(-1)),
+           data.transport_offset.reshape(-1),
+           out=result)
+    return
+
+
+def apply_transport_operator_jit(data):
+    """Same as :func:`apply_transport_operator`,
+    but uses the compiled :func:`~boltzpy.jit.transport_kernel`.
+
+    Falls back to :func:`apply_transport_operator`,
+    if Numba is not installed.
+    """
+    if not bp_jit.HAS_NUMBA:
+        apply_transport_operator(data)
+        return
+    matrix = data.transport_mat
+    bp_jit.transport_kernel(matrix.indptr,
+                            matrix.indices,
+                            matrix.data,
+                            data.state.reshape(-1),
+                            data.transport_offset.reshape(-1),
+                            data.result.reshape(-1),
+                            data.state.shape[1])
+    return
+
+
+def get_transport_function(transport):
+    """Returns the function, that applies the transport operator
+    for the given :attr:`Scheme.Transport`.
+
+    The function is called as function(data).
+    """
+    if transport == "FiniteDifferences_FirstOrder":
+        return apply_transport_operator
+    elif transport == "FiniteDifferences_FirstOrder_JIT":
+        return apply_transport_operator_jit
+    else:
+        msg = ('Unsupported Transport:'
+               + '{}'.format(transport))
+        raise NotImplementedError(msg)
+
+
+def transport_matrix_inner(data, affected_points, dt=None):
+    """Sparse matrix of :func:`transport_fdm_inner`.
+
+    Applied to the flattened data.state,
+    it returns the flattened data.result of the affected points.
+    All other rows are zero.
+    If dt is None, then data.dt is used as the time step."""
+    if data.p_dim != 1:
+        message = 'Transport is currently only implemented ' \
+                  'for 1D Problems'
+        raise NotImplementedError(message)
+    if dt is None:
+        dt = data.dt
+    affected_points = np.array(affected_points, dtype=int)
+    v_size = data.vG.shape[0]
+    size = data.p_size * v_size
+    pv = data.vG + data.velocity_offset
+    # use the same expressions as in transport_outflow_remains
+    # and transport_inflow_innerPoint
+    outflow_percentage = (np.abs(data.vG[:, 0] + data.velocity_offset[0])
+                          * dt
+                          / data.dp)
+    inflow_percentage = (dt / data.dp * np.abs(pv[:, 0]))
+    velocities = np.arange(v_size)
+    # indices of the flattened state
+    rows = affected_points[:, np.newaxis] * v_size + velocities
+    # remaining particles
+    remain_vals = np.broadcast_to(1 - outflow_percentage, rows.shape)
+    # inflow from the neighbouring points,
+    # velocities with pv[0] == 0 have no inflow
+    moving_vels = np.where(pv[:, 0] != 0)[0]
+    direction = np.where(pv[moving_vels, 0] < 0, 1, -1)
+    neighbours = affected_points[:, np.newaxis] + direction
+    inflow_rows = rows[:, moving_vels]
+    inflow_cols = neighbours * v_size + moving_vels
+    inflow_vals = np.broadcast_to(inflow_percentage[moving_vels],
+                                  inflow_rows.shape)
+    matrix = csr_matrix(
+        (np.concatenate((remain_vals.flatten(), inflow_vals.flatten())),
+         (np.concatenate((rows.flatten(), inflow_rows.flatten())),
+          np.concatenate((rows.flatten(), inflow_cols.flatten())))),
+        shape=(size, size))
+    return matrix
+
+
+def transport_matrix_boundary(data,
+                              affected_points,
+                              incoming_velocities,
+                              reflection_matrix,
+                              dt=None):
+    """Sparse matrix of the transport step of a
+    :class:`~boltzpy.BoundaryPointRule`.
+
+    The reflection must be linear in the inflow.
+    The reflection_matrix R is of shape (V, V),
+    such that the reflected inflow is inflow @ R.
+    If dt is None, then data.dt is used as the time step."""
+    if data.p_dim != 1:
+        message = 'Transport is currently only implemented ' \
+                  'for 1D Problems'
+        raise NotImplementedError(message)
+    if dt is None:
+        dt = data.dt
+    affected_points = np.array(affected_points, dtype=int)
+    v_size = data.vG.shape[0]
+    size = data.p_size * v_size
+    pv = data.vG + data.velocity_offset
+    outflow_percentage = (np.abs(data.vG[:, 0] + data.velocity_offset[0])
+                          * dt
+                          / data.dp)
+    inflow_percentage = (dt / data.dp * np.abs(pv[:, 0]))
+    velocities = np.arange(v_size)
+    rows = affected_points[:, np.newaxis] * v_size + velocities
+    remain_vals = np.broadcast_to(1 - outflow_percentage, rows.shape)
+    # only incoming velocities flow into the boundary point
+    # and are reflected afterwards
+    in_vels = incoming_velocities[pv[incoming_velocities, 0] != 0]
+    direction = np.where(pv[in_vels, 0] < 0, 1, -1)
+    # inflow of velocity v into point p is reflected
+    # into all velocities w with reflection_matrix[v, w] != 0
+    refl = reflection_matrix[in_vels] * inflow_percentage[in_vels, None]
+    (idx_v, idx_w) = np.nonzero(refl)
+    refl_rows = affected_points[:, np.newaxis] * v_size + idx_w
+    refl_cols = ((affected_points[:, np.newaxis] + direction[idx_v])
+                 * v_size + in_vels[idx_v])
+    refl_vals = np.broadcast_to(refl[idx_v, idx_w], refl_rows.shape)
+    matrix = csr_matrix(
+        (np.concatenate((remain_vals.flatten(), refl_vals.flatten())),
+         (np.concatenate((rows.flatten(), refl_rows.flatten())),
+          np.concatenate((rows.flatten(), refl_cols.flatten())))),
+        shape=(size, size))
+    return matrix
+
+
+def transport_matrix_none(data, affected_points):
+    """Sparse matrix of :func:`no_transport`.
+
+    The affected points keep their current value of data.result,
+    thus all rows are zero."""
+    v_size = data.vG.shape[0]
+    size = data.p_size * v_size
+    return csr_matrix((size, size), dtype=float)
+
+
 ##################################
 #           Collisions           #
 ##################################
 # Todo this needs the col_mat, make sure this is the case
 def euler_scheme(data, affected_points):
-    """Executes a single collision step on complete P-Grid"""
-    for p in affected_points:
-        u_c0 = data.state[p, data.col[:, 0]]
-        u_c1 = data.state[p, data.col[:, 1]]
-        u_c2 = data.state[p, data.col[:, 2]]
-        u_c3 = data.state[p, data.col[:, 3]]
+    """Executes a single collision step on complete P-Grid
+
+    The collision factors of all affected points are computed at once
+    and added to the velocities by :func:`collision_update_matrix`.
+    To bound the memory usage, the points are processed in batches
+    (see :const:`~boltzpy.constants.COLLISION_BATCH_SIZE`).
+    """
+    n_cols = max(data.col.shape[0], 1)
+    batch_size = max(bp_c.COLLISION_BATCH_SIZE // n_cols, 1)
+    for beg in range(0, affected_points.size, batch_size):
+        points = affected_points[beg: beg + batch_size]
+        state = data.state[points]
+        u_c0 = state[:, data.col[:, 0]]
+        u_c1 = state[:, data.col[:, 1]]
+        u_c2 = state[:, data.col[:, 2]]
+        u_c3 = state[:, data.col[:, 3]]
         col_factor = (np.multiply(u_c0, u_c2) - np.multiply(u_c1, u_c3))
-        data.state[p] += data.col_mat.dot(col_factor)
+        data.state[points] += collision_update_matrix(data, col_factor)
     return
 
 
+def collision_update_matrix(data, col_factor):
+    """Returns the changes of the state by the given collision factors,
+    as a single sparse-dense product with the collision matrix."""
+    # unit_col_mat has shape (V, N_coll), col_factor has shape (P, N_coll)
+    return data.dt * data.unit_col_mat.dot(col_factor.T).T
+
+
+def euler_scheme_threaded(data, affected_points):
+    """Executes a single collision step, using multiple threads.
+
+    The affected points are split into contiguous blocks,
+    each block is computed by :func:`euler_scheme` in a separate thread.
+    NumPy and scipy release the GIL for most of the work.
+    Each thread uses its own temporary arrays.
+    The points are independent of each other,
+    thus the results are bitwise equal to :func:`euler_scheme`.
+    The number of threads is given by data.threads.
+    The threads are kept in data.thread_pool,
+    until :meth:`~boltzpy.Data.shutdown_thread_pool` is called.
+    """
+    threads = data.threads
+    if threads is None:
+        threads = os.cpu_count()
+    blocks = [block for block in np.array_split(affected_points, threads)
+              if block.size > 0]
+    if len(blocks) <= 1:
+        euler_scheme(data, affected_points)
+        return
+    if data.thread_pool is None:
+        data.thread_pool = ThreadPoolExecutor(max_workers=threads)
+    futures = [data.thread_pool.submit(euler_scheme, data, block) for block in blocks]
+    # raises the errors of the threads
+    for future in futures:
+        future.result()
+    return
+
+
+def euler_scheme_jit(data, affected_points):
+    """Executes a single collision step, using the compiled
+    :func:`~boltzpy.jit.collision_kernel`.
+
+    Falls back to :func:`euler_scheme`, if Numba is not installed.
+    The results differ from :func:`euler_scheme`
+    only by rounding errors.
+    """
+    if not bp_jit.HAS_NUMBA:
+        euler_scheme(data, affected_points)
+        return
+    bp_jit.collision_kernel(data.state,
+                            np.array(affected_points, dtype=np.int64),
+                            data.col,
+                            data.dt * data.weight)
+    return
+
+
+def gain_loss_scheme(data, affected_points):
+    """Executes a single collision step,
+    using the gain/loss form of the collision operator.
+
+    The collision operator is split into a gain term G
+    and a loss term f * nu, with the collision frequency nu
+    (see :func:`gain_loss_operators`).
+    The loss term is treated implicitly:
+    f_new = (f + dt * G) / (1 + dt * nu).
+    This keeps the state non-negative for any time step,
+    which permits larger time steps for stiff collision rates.
+    For small time steps the results converge to :func:`euler_scheme`.
+    Mass, momentum and energy are conserved
+    up to an error of order dt**2.
+    """
+    [gain_pre, gain_post, loss] = data.gain_loss_operators
+    n_cols = max(data.col.shape[0], 1)
+    batch_size = max(bp_c.COLLISION_BATCH_SIZE // n_cols, 1)
+    for beg in range(0, affected_points.size, batch_size):
+        points = affected_points[beg: beg + batch_size]
+        state = data.state[points]
+        # products of the pre and post collision velocities
+        product_pre = state[:, data.col[:, 0]] * state[:, data.col[:, 2]]
+        product_post = state[:, data.col[:, 1]] * state[:, data.col[:, 3]]
+        gain = (gain_pre.dot(product_pre.T)
+                + gain_post.dot(product_post.T)).T
+        frequency = loss.dot(state.T).T
+        data.state[points] = ((state + data.dt * gain)
+                              / (1 + data.dt * frequency))
+    return
+
+
+def gain_loss_operators(col, weight, v_size):
+    """Sparse matrices of the gain/loss form of the collision operator.
+
+    For the collision factors
+    f[v0] * f[w0] - f[v1] * f[w1] of :func:`euler_scheme`,
+    the pre collision velocities v0, w0 gain f[v1] * f[w1]
+    and lose f[v0] * f[w0], the post collision velocities vice versa.
+    The loss of each velocity is its value times the
+    collision frequency nu, a linear function of the state.
+
+    Parameters
+    ----------
+    col : :obj:`~numpy.array` [:obj:`int`]
+        Collision relations, of shape (N, 4).
+    weight : :obj:`~numpy.array` [:obj:`float`]
+        Collision weights.
+    v_size : :obj:`int`
+        Size of the velocity grid.
+
+    Returns
+    -------
+    gain_pre : :class:`~scipy.sparse.csr_matrix`
+        Gain by the pre collision products, of shape (V, N).
+    gain_post : :class:`~scipy.sparse.csr_matrix`
+        Gain by the post collision products, of shape (V, N).
+    loss : :class:`~scipy.sparse.csr_matrix`
+        Maps the state to the collision frequency, of shape (V, V).
+    """
+    n_cols = col.shape[0]
+    collisions = np.arange(n_cols)
+    # the post collision velocities gain the pre collision products
+    gain_pre = csr_matrix(
+        (np.concatenate((weight, weight)),
+         (np.concatenate((col[:, 1], col[:, 3])),
+          np.concatenate((collisions, collisions)))),
+        shape=(v_size, n_cols))
+    gain_post = csr_matrix(
+        (np.concatenate((weight, weight)),
+         (np.concatenate((col[:, 0], col[:, 2])),
+          np.concatenate((collisions, collisions)))),
+        shape=(v_size, n_cols))
+    # the collision partner determines the frequency
+    # v0 <-> w0 and v1 <-> w1
+    loss = csr_matrix(
+        (np.concatenate((weight, weight, weight, weight)),
+         (np.concatenate((col[:, 0], col[:, 2], col[:, 1], col[:, 3])),
+          np.concatenate((col[:, 2], col[:, 0], col[:, 3], col[:, 1])))),
+        shape=(v_size, v_size))
+    return [gain_pre, gain_post, loss]
+
+
+
+
+def get_collision_function(collisions_computation):
+    """Returns the collision kernel
+    of the given :attr:`Scheme.Collisions_Computation`.
+
+    The kernel is called as function(data, affected_points).
+    """
+    if collisions_computation in {"EulerScheme", "HeunScheme_Adaptive"}:
+        return euler_scheme
+    elif collisions_computation == "EulerScheme_Threaded":
+        return euler_scheme_threaded
+    elif collisions_computation == "EulerScheme_JIT":
+        return euler_scheme_jit
+    elif collisions_computation == "GainLoss_SemiImplicit":
+        return gain_loss_scheme
+    else:
+        msg = ('Unsupported Collisions_Computation:'
+               + '{}'.format(collisions_computation))
+        raise NotImplementedError(msg)
+
+
 def no_collisions(data, affected_points):
     """No Collisions are done here"""
     return
@@ -38,6 +38,59 @@ SUPP_COLORS = ['blue', 'red', 'green',
 INVALID_CHARACTERS = {'"', "'", '/', '§', '$', '&',
                       '+', '#', ',', ';', '\\', '`', '´'}
 
+#: :obj:`str` :
+#: Directory of the :class:`~boltzpy.collisions.CollisionCache`.
+#: Can be set by the environment variable *BOLTZPY_COLLISION_CACHE*.
+COLLISION_CACHE_DIRECTORY = os.environ.get(
+    "BOLTZPY_COLLISION_CACHE",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                 "Simulations",
+                 "collision_cache"))
+
+#: :obj:`int` :
+#: Maximum total size (in bytes) of all files
+#: in the :class:`~boltzpy.collisions.CollisionCache`.
+#: If exceeded, the least recently used entries are removed.
+COLLISION_CACHE_MAX_SIZE = 2 * 1024**3
+
+#: :obj:`int` :
+#: Maximum number of entries of the collision factors,
+#: that are computed at once in :func:`~boltzpy.compute.euler_scheme`.
+#: The space points are processed in batches of this size
+#: (in units of the number of collisions), to bound the memory usage.
+COLLISION_BATCH_SIZE = 2**22
+
+#: :obj:`set` [:obj:`str`] :
+#: Set of all supported levels of
+#: :meth:`~boltzpy.Collisions.check_integrity`.
+#:      * **basic**: shapes, types, ordering and positive weights,
+#:        if a context is given, then also the velocity indices
+#:        and the species of the velocities
+#:      * **full**: additionally the conservation of momentum and energy
+SUPP_COLLISION_CHECK_LEVELS = {"basic", "full"}
+
+#: :obj:`str` :
+#: Default level of :meth:`~boltzpy.Collisions.check_integrity`,
+#: see :const:`SUPP_COLLISION_CHECK_LEVELS`.
+COLLISION_CHECK_LEVEL = "basic"
+
+#: :obj:`float` :
+#: Default relative error tolerance of adaptive time stepping
+#: (see :func:`~boltzpy.compute.adaptive_time_step`).
+ADAPTIVE_TOLERANCE = 1e-2
+
+#: :obj:`int` :
+#: Maximum number of pending output steps,
+#: if results are written asynchronously
+#: (see :meth:`~boltzpy.Simulation.compute`).
+OUTPUT_QUEUE_SIZE = 4
+
+#: :obj:`set` [:obj:`str`] :
+#: Set of all currently supported compression filters
+#: of result datasets (see :meth:`~boltzpy.Simulation.compute`).
+#: None denotes uncompressed datasets.
+SUPP_COMPRESSION = {None, "gzip", "lzf"}
+
 #: :obj:`set` [:obj:`int`] :
 #: Set of all currently supported
 #: for :class:`~boltzpy.Grid`
@@ -1,7 +1,11 @@
 
+import copy
 import numpy as np
 
 import boltzpy as bp
+import boltzpy.constants as bp_c
+import boltzpy.compute as bp_cp
+import boltzpy.output as bp_o
 
 
 # Todo Add vG_squared and vG_norm attributes? faster output?
@@ -40,6 +44,33 @@ class Data:
         Current size of a time step.
         This may change during the simulation,
         if time-adaptive algorithms are used.
+    transport_dt : :obj:`float`
+        Size of a single transport step.
+        Differs from :attr:`dt` for higher order operator splitting.
+    operator_splitting : :obj:`str`
+        The operator splitting of the :class:`~boltzpy.Scheme`.
+    step_size : :obj:`int`
+        Size of the current time step,
+        as a multiple of the :class:`~boltzpy.Grid` delta of the time grid.
+        Only adaptive schemes use step sizes other than 1.
+    proposed_step_size : :obj:`int`
+        Step size, that is proposed by the adaptive scheme
+        for the next time step.
+    tolerance : :obj:`float`
+        Relative error tolerance of adaptive schemes.
+    collision_function : :obj:`callable`
+        The collision kernel of the :class:`~boltzpy.Scheme`,
+        see :func:`~boltzpy.compute.get_collision_function`.
+    transport_function : :obj:`callable`
+        Applies the transport operator,
+        see :func:`~boltzpy.compute.get_transport_function`.
+    threads : :obj:`int`
+        Number of threads of threaded collision kernels.
+        If None, then all cores are used.
+    thread_pool : :obj:`~concurrent.futures.ThreadPoolExecutor`
+        Threads of the threaded collision kernels.
+        Is created by the first threaded collision step,
+        see :meth:`shutdown_thread_pool`.
     tG : :obj:`~numpy.array` [:obj:`int`]
         Contains the time steps at which the output is written to file.
     dp : :obj:`float`
@@ -50,6 +81,9 @@ class Data:
         Size of the position space :class:`boltzpy.Grid`.
     m : :obj:`~numpy.array` [:obj:`int`]
         Denotes the mass of every :class:`~boltzpy.Specimen`
+    moment_matrices : :obj:`list` [:obj:`~numpy.array` [:obj:`float`]]
+        Contains the :func:`~boltzpy.output.moment_matrix`
+        of every :class:`~boltzpy.Specimen`.
     category : :obj:`~numpy.array` [:obj:`int`]
         Defines the behaviour of each point in P-Space
         in the computation.
@@ -57,6 +91,38 @@ class Data:
     def __init__(self, file_address):
         # create temporary Simulation instance
         sim = bp.Simulation.load(file_address)
+        self.setup(sim)
+        return
+
+    @staticmethod
+    def from_simulation(simulation):
+        """Set up and return a :class:`Data` instance
+        directly from a :class:`~boltzpy.Simulation` in memory,
+        without reading its file.
+
+        If the collisions of the simulation are not set up yet,
+        then they are generated and stored in the simulation.
+
+        Parameters
+        ----------
+        simulation : :class:`~boltzpy.Simulation`
+
+        Returns
+        -------
+        self : :class:`Data`
+        """
+        assert isinstance(simulation, bp.Simulation)
+        self = Data.__new__(Data)
+        self.setup(simulation)
+        return self
+
+    def setup(self, sim):
+        """Initializes all parameters from the given simulation.
+
+        Parameters
+        ----------
+        sim : :class:`~boltzpy.Simulation`
+        """
         # data arrays, this contains all grids
         # Todo Rework initialization (move into rules?)
         # Todo Class for single Space points (V-Grid + 0.Moment)?
@@ -76,10 +142,35 @@ class Data:
 
         self.n_spc = sim.s.size
         self.m = sim.s.mass
+        # moments of each specimen are computed by a single product
+        self.moment_matrices = [
+            bp_o.moment_matrix(self.dv[s],
+                               sim.sv.vGrids[s].pG,
+                               self.m[s])
+            for s in range(self.n_spc)]
 
         self.t = 0
         self.tG = sim.t.iG  # keep it, for adaptive time grids
         self.dt = sim.t.delta
+        # second order splitting uses two half steps of transport
+        self.operator_splitting = sim.scheme.OperatorSplitting
+        if self.operator_splitting == "SecondOrder":
+            self.transport_dt = self.dt / 2
+        else:
+            self.transport_dt = self.dt
+        # time steps are multiples of the time grids delta
+        self.step_size = 1
+        self.proposed_step_size = 1
+        self.tolerance = bp_c.ADAPTIVE_TOLERANCE
+        # collision kernel, used by the rules
+        self.collision_function = bp_cp.get_collision_function(
+            sim.scheme.Collisions_Computation)
+        # applies the transport operator
+        self.transport_function = bp_cp.get_transport_function(
+            sim.scheme.Transport)
+        # number of threads of threaded kernels, None uses all cores
+        self.threads = None
+        self.thread_pool = None
 
         self.dp = sim.p.delta
         self.p_dim = sim.p.ndim
@@ -103,12 +194,98 @@ class Data:
         # todo behaviour / reinitialization
 
         self._params = dict()
-        # Keep as a "conditional" attribute?
-        self._params["col_mat"] = sim.coll.generate_collision_matrix(sim.t.delta)
+        # The collision matrix is independent of the time step,
+        # dt is multiplied as a scalar in the collision step
+        self._params["unit_col_mat"] = sim.coll.generate_collision_matrix()
+        # Transport is a linear operator, computed only once
+        [self._params["transport_mat"],
+         self._params["transport_offset"]] = sim.geometry.transport_operator(
+            self,
+            self.transport_dt)
+        if sim.scheme.Collisions_Computation == "GainLoss_SemiImplicit":
+            self._params["gain_loss_operators"] = bp_cp.gain_loss_operators(
+                self.col,
+                self.weight,
+                self.state.shape[1])
+        # transport operators of all used step sizes, see set_step_size()
+        self._params["geometry"] = sim.geometry
+        self._params["base_dt"] = self.dt
+        self._params["base_transport_dt"] = self.transport_dt
+        self._params["transport_operators"] = {
+            1: [self._params["transport_mat"],
+                self._params["transport_offset"]]}
         return
 
     def __getattr__(self, item):
-        return self._params[item]
+        # _params and special methods are never parameters,
+        # this prevents infinite recursions in copy or pickle
+        if item == "_params" or item.startswith("__"):
+            raise AttributeError(item)
+        try:
+            return self._params[item]
+        except KeyError:
+            raise AttributeError(item)
+
+    def snapshot(self):
+        """Returns a shallow copy with an independent copy of :attr:`state`.
+
+        The snapshot is not changed by further computation steps.
+        It is used to write results asynchronously.
+        """
+        snapshot = copy.copy(self)
+        snapshot.state = np.copy(self.state)
+        return snapshot
+
+    def shutdown_thread_pool(self):
+        """Stops the threads of :attr:`thread_pool`, if any.
+
+        Further threaded collision steps create a new pool.
+        """
+        if self.thread_pool is not None:
+            self.thread_pool.shutdown()
+            self.thread_pool = None
+        return
+
+    @property
+    def max_step_size(self):
+        """:obj:`int` :
+        Largest multiple of the base time step,
+        that satisfies the Courant-Friedrichs-Levy Condition
+        (see :meth:`check_stability_conditions`).
+        """
+        max_v = np.max(np.linalg.norm(self.vG, axis=1))
+        if max_v == 0:
+            return np.iinfo(int).max
+        # largest integer n with max_v * n * base_dt / dp < 1/2
+        max_step_size = int(np.ceil(self.dp / (2 * max_v * self.base_dt))) - 1
+        return max(max_step_size, 1)
+
+    def set_step_size(self, step_size):
+        """Sets the size of the following time steps
+        to a multiple of the base time step.
+
+        Changes :attr:`dt`, :attr:`transport_dt`
+        and the transport operators accordingly.
+        The transport operators are computed only once for each step size.
+        The collision matrix is independent of the step size.
+
+        Parameters
+        ----------
+        step_size : :obj:`int`
+        """
+        step_size = int(step_size)
+        assert step_size >= 1
+        operators = self._params["transport_operators"]
+        if step_size not in operators:
+            operators[step_size] = self.geometry.transport_operator(
+                self,
+                step_size * self.base_transport_dt)
+        [self._params["transport_mat"],
+         self._params["transport_offset"]] = operators[step_size]
+        self.dt = step_size * self.base_dt
+        self.transport_dt = step_size * self.base_transport_dt
+        self.step_size = step_size
+        return
 
     # Todo Add more check_integrity / stability conditions?
     # Todo raise Warnings for weird configurations?
@@ -1,5 +1,6 @@
 
 import numpy as np
+from scipy.sparse import csr_matrix
 import h5py
 
 import boltzpy as bp
@@ -145,9 +146,42 @@ class Geometry(bp.BaseClass):
             rule.collision(data)
         return
 
-    def transport(self, data):
+    def transport_operator(self, data, dt=None):
+        """Combines the transport operators of all :attr:`rules`.
+
+        The transport step is computed as
+        data.result = matrix @ data.state + offset,
+        with flattened arrays.
+
+        Parameters
+        ----------
+        data : :class:`~boltzpy.Data`
+        dt : :obj:`float`, optional
+            Time step of the transport.
+            If None, then data.dt is used.
+
+        Returns
+        -------
+        matrix : :class:`~scipy.sparse.csr_matrix`
+        offset : :obj:`~numpy.array` [:obj:`float`]
+            Array of the same shape as data.state.
+        """
+        v_size = data.vG.shape[0]
+        size = self.size * v_size
+        matrix = csr_matrix((size, size), dtype=float)
+        offset = np.zeros((self.size, v_size), dtype=float)
         for rule in self.rules:
-            rule.transport(data)
+            [rule_matrix, rule_offset] = rule.transport_operator(data, dt)
+            # the affected points of the rules are disjoint
+            matrix = matrix + rule_matrix
+            offset[rule.affected_points] = rule_offset
+        return [matrix.tocsr(), offset]
+
+    def transport(self, data):
+        """Executes a single transport step for all points,
+        by applying the precomputed
+        :meth:`transport_operator` of data."""
+        data.transport_function(data)
         # update data.state (transport writes into data.result)
         data.state[...] = data.result[...]
         return
@@ -224,13 +224,12 @@ class Grid(bp.BaseClass):
     #####################################
     #               Indexing            #
     #####################################
-    # Todo write Gird.binary_search (iterate over dimensions
-    # Todo or: compute value by module operations
-    # Todo      write proper tests for this
     def get_index(self, integer_value):
-        """Find index of given grid_entry in :attr:`iMG`
+        """Find index of given grid_entry in :attr:`iG`
         Returns None, if the value is not in the specified Grid.
 
+        See :meth:`get_indices`.
+
         Parameters
         ----------
         integer_value : :obj:`~numpy.array` [:obj:`int`]
@@ -239,10 +238,50 @@ class Grid(bp.BaseClass):
         -------
         index : :obj:`int` of :obj:`None`
         """
-        grid_iterator = (idx for (idx, value) in enumerate(self.iG)
-                         if np.all(value == integer_value))
-        local_index = next(grid_iterator, None)
-        return local_index
+        integer_values = np.reshape(integer_value, (1, self.ndim))
+        local_index = int(self.get_indices(integer_values)[0])
+        if local_index == -1:
+            return None
+        else:
+            return local_index
+
+    def get_indices(self, integer_values):
+        """Find the indices of several grid entries in :attr:`iG`.
+        Returns -1 for each value that is not in the specified Grid.
+
+        The Grid is a regular lattice,
+        starting at :attr:`iG` [0] with a step size of :attr:`spacing`
+        in each dimension.
+        Thus the index is computed directly
+        from the (integer) values by modular arithmetic.
+
+        Parameters
+        ----------
+        integer_values : :obj:`~numpy.array` [:obj:`int`]
+            Array of shape (number_of_values, :attr:`ndim`).
+
+        Returns
+        -------
+        indices : :obj:`~numpy.array` [:obj:`int`]
+            Array of shape (number_of_values,).
+        """
+        assert self.iG is not None
+        integer_values = np.array(integer_values, dtype=int)
+        assert integer_values.ndim == 2
+        assert integer_values.shape[1] == self.ndim
+        shifted_values = integer_values - self.iG[0]
+        # only multiples of spacing are grid points
+        is_in_grid = np.all(shifted_values % self.spacing == 0, axis=1)
+        multi_indices = shifted_values // self.spacing
+        # check bounds
+        shape = np.array(self.shape, dtype=int)
+        is_in_grid &= np.all((multi_indices >= 0)
+                             & (multi_indices < shape),
+                             axis=1)
+        # iG is ordered like a C-ordered array of this shape
+        multi_indices[~is_in_grid] = 0
+        indices = np.ravel_multi_index(multi_indices.transpose(), self.shape)
+        return np.where(is_in_grid, indices, -1)
 
     #####################################
     #           Visualization           #
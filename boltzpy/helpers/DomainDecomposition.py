@@ -0,0 +1,195 @@
+import copy
+import multiprocessing
+from multiprocessing import shared_memory
+import threading
+import numpy as np
+
+
+class DomainDecomposition:
+    """Executes the time steps in parallel worker processes.
+
+    The P-Grid is split into contiguous blocks of points,
+    one block per process.
+    The state is held in shared memory.
+    Each worker executes the transport and collision steps
+    of its own block.
+    The transport reads the neighbouring (halo) points of the other blocks
+    directly from the shared state.
+    Barriers synchronize the workers,
+    such that no halo point is read while it is changed.
+    The results are bitwise equal to a serial computation.
+
+    Only fixed time steps are supported.
+
+    Parameters
+    ----------
+    data : :class:`~boltzpy.Data`
+    rules : :obj:`~numpy.array` [:class:`~boltzpy.Rule`]
+        The collisions are computed by the rules of each block.
+    operator_splitting : :obj:`str`
+        Either "FirstOrder" or "SecondOrder".
+    processes : :obj:`int`
+        Number of worker processes.
+        Is reduced to the number of points, if necessary.
+    """
+    def __init__(self, data, rules, operator_splitting, processes):
+        assert operator_splitting in {"FirstOrder", "SecondOrder"}
+        assert processes >= 1
+        assert data.step_size == 1
+        shape = data.state.shape
+        processes = min(processes, shape[0])
+        self.blocks = np.array_split(np.arange(shape[0]), processes)
+        # state and transport results are held in shared memory
+        self.shared_memory = []
+        for _ in range(2):
+            shm = shared_memory.SharedMemory(create=True,
+                                             size=max(data.state.nbytes, 1))
+            self.shared_memory.append(shm)
+        [self.state, result] = [np.ndarray(shape, dtype=float, buffer=s.buf)
+                                for s in self.shared_memory]
+        self.state[...] = data.state
+        result[...] = data.result
+
+        context = multiprocessing.get_context()
+        barrier = context.Barrier(processes)
+        self.connections = []
+        self.workers = []
+        for block in self.blocks:
+            [parent_conn, child_conn] = context.Pipe()
+            worker_data = copy.copy(data)
+            # the state is replaced by the shared state in the worker
+            worker_data.state = None
+            worker_data.result = None
+            # each worker creates its own threads
+            worker_data.thread_pool = None
+            block_rules = []
+            for rule in rules:
+                block_rule = copy.copy(rule)
+                block_rule.affected_points = np.intersect1d(
+                    rule.affected_points,
+                    block)
+                if block_rule.affected_points.size > 0:
+                    block_rules.append(block_rule)
+            worker = context.Process(
+                target=_run_worker,
+                args=(child_conn,
+                      barrier,
+                      [s.name for s in self.shared_memory],
+                      shape,
+                      worker_data,
+                      block_rules,
+                      (block[0], block[-1] + 1),
+                      operator_splitting),
+                daemon=True)
+            worker.start()
+            child_conn.close()
+            self.connections.append(parent_conn)
+            self.workers.append(worker)
+        return
+
+    def step(self, data, number_of_steps):
+        """Executes number_of_steps time steps in parallel
+        and updates data.state and data.t afterwards."""
+        assert number_of_steps >= 0
+        for conn in self.connections:
+            conn.send(("step", number_of_steps))
+        errors = [conn.recv() for conn in self.connections]
+        errors = [error for error in errors if error is not None]
+        if errors:
+            # prefer the original error over broken barriers
+            errors.sort(key=lambda e: isinstance(e,
+                                                 threading.BrokenBarrierError))
+            raise errors[0]
+        data.state[...] = self.state
+        data.t += number_of_steps
+        return
+
+    def close(self):
+        """Stops all workers and releases the shared memory.
+        Further calls have no effect."""
+        for (conn, worker) in zip(self.connections, self.workers):
+            if worker.is_alive():
+                try:
+                    conn.send(("close", None))
+                except (BrokenPipeError, OSError):
+                    pass
+            worker.join()
+            conn.close()
+        self.connections = []
+        self.workers = []
+        for shm in self.shared_memory:
+            shm.close()
+            shm.unlink()
+        self.shared_memory = []
+        self.state = None
+        return
+
+
+def _run_worker(conn,
+                barrier,
+                shared_memory_names,
+                shape,
+                data,
+                rules,
+                block_range,
+                operator_splitting):
+    shared = [shared_memory.SharedMemory(name=name)
+              for name in shared_memory_names]
+    try:
+        [state, result] = [np.ndarray(shape, dtype=float, buffer=s.buf)
+                           for s in shared]
+        data.state = state
+        data.result = result
+        [beg, end] = block_range
+        v_size = shape[1]
+        # transport operator of the block, restricted to the halo points
+        matrix = data.transport_mat[beg * v_size: end * v_size]
+        if matrix.nnz > 0:
+            halo_beg = np.min(matrix.indices) // v_size
+            halo_end = np.max(matrix.indices) // v_size + 1
+        else:
+            [halo_beg, halo_end] = block_range
+        halo_beg = min(halo_beg, beg)
+        halo_end = max(halo_end, end)
+        matrix = matrix[:, halo_beg * v_size: halo_end * v_size]
+        offset = data.transport_offset[beg:end].reshape(-1)
+
+        def transport():
+            np.add(matrix.dot(state[halo_beg:halo_end].reshape(-1)),
+                   offset,
+                   out=result[beg:end].reshape(-1))
+            # the halo points are read by the neighbouring blocks
+            barrier.wait()
+            state[beg:end] = result[beg:end]
+            return
+
+        def collision():
+            for rule in rules:
+                rule.collision(data)
+            # the next transport reads the halo points
+            barrier.wait()
+            return
+
+        while True:
+            (command, number_of_steps) = conn.recv()
+            if command == "close":
+                return
+            try:
+                for _ in range(number_of_steps):
+                    transport()
+                    collision()
+                    if operator_splitting == "SecondOrder":
+                        transport()
+                        barrier.wait()
+                    assert np.all(state[beg:end] >= 0)
+                conn.send(None)
+            except BaseException as error:
+                # release the other workers
+                barrier.abort()
+                conn.send(error)
+                return
+    finally:
+        data.shutdown_thread_pool()
+        for s in shared:
+            s.close()
+        conn.close()
@@ -0,0 +1,72 @@
+import queue
+import threading
+
+
+class ResultWriter:
+    """Writes results in a background thread.
+
+    The items are processed in order by write_function,
+    afterwards the HDF5 file is flushed.
+    The queue is bounded, thus :meth:`put` blocks,
+    if the writer falls too far behind.
+    Errors of the writer thread are raised
+    by the next call of :meth:`put` or :meth:`close`.
+
+    Parameters
+    ----------
+    write_function : :obj:`callable`
+        Is called as write_function(data, tw_idx, hdf_group).
+    hdf_group : :obj:`h5py.Group <h5py:Group>`
+    queue_size : :obj:`int`
+        Maximum number of pending items.
+    """
+    def __init__(self, write_function, hdf_group, queue_size):
+        assert queue_size >= 1
+        self.write_function = write_function
+        self.hdf_group = hdf_group
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.error = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            # skip remaining items after an error
+            if self.error is not None:
+                continue
+            (data, tw_idx) = item
+            try:
+                self.write_function(data, tw_idx, self.hdf_group)
+                self.hdf_group.file.flush()
+            except Exception as error:
+                self.error = error
+
+    def put(self, data, tw_idx):
+        """Adds a snapshot of data to the queue.
+        The snapshot must not be changed afterwards."""
+        self._raise_error()
+        self.queue.put((data, tw_idx))
+        return
+
+    def close(self):
+        """Waits until all items are written and stops the thread.
+        Further calls have no effect."""
+        if self.thread.is_alive():
+            self.close_quietly()
+            self._raise_error()
+        return
+
+    def close_quietly(self):
+        """Like :meth:`close`, but errors of the writer thread are ignored.
+        Is used, if another error is raised already."""
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        return
+
+    def _raise_error(self):
+        if self.error is not None:
+            raise self.error
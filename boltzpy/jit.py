@@ -0,0 +1,75 @@
+r"""Optional compiled kernels of the computation.
+
+The kernels are compiled by `Numba <https://numba.pydata.org>`_,
+if it is installed.
+Otherwise :const:`HAS_NUMBA` is False and the callers
+(see :func:`~boltzpy.compute.euler_scheme_jit`
+and :func:`~boltzpy.compute.apply_transport_operator_jit`)
+fall back to the NumPy implementation.
+"""
+try:
+    import numba
+except ImportError:
+    numba = None
+
+#: :obj:`bool` : True, if Numba is installed and the kernels are compiled.
+HAS_NUMBA = numba is not None
+
+if HAS_NUMBA:
+    prange = numba.prange
+else:
+    prange = range
+
+
+def collision_kernel(state, affected_points, col, weights):
+    """Executes a single collision step of the affected points.
+
+    The collision factor u[c0]*u[c2] - u[c1]*u[c3]
+    of each collision is added directly to its four velocities.
+    Neither the collision factors of all points
+    nor the collision matrix are materialized.
+    The points are computed in parallel.
+
+    Parameters
+    ----------
+    state : :obj:`~numpy.array` [:obj:`float`]
+        Is changed in place.
+    affected_points : :obj:`~numpy.array` [:obj:`int`]
+    col : :obj:`~numpy.array` [:obj:`int`]
+        Collision relations, of shape (N, 4).
+    weights : :obj:`~numpy.array` [:obj:`float`]
+        Collision weights, multiplied with the time step.
+    """
+    for i in prange(affected_points.size):
+        p = affected_points[i]
+        # the collision factors use the state before the collision step
+        u = state[p].copy()
+        for j in range(col.shape[0]):
+            factor = weights[j] * (u[col[j, 0]] * u[col[j, 2]]
+                                   - u[col[j, 1]] * u[col[j, 3]])
+            state[p, col[j, 0]] -= factor
+            state[p, col[j, 1]] += factor
+            state[p, col[j, 2]] -= factor
+            state[p, col[j, 3]] += factor
+    return
+
+
+def transport_kernel(indptr, indices, values, state, offset, result, v_size):
+    """Computes result = matrix @ state + offset,
+    for a CSR matrix and flattened arrays.
+
+    The rows of each point are computed in parallel.
+    """
+    for p in prange(result.size // v_size):
+        for row in range(p * v_size, (p + 1) * v_size):
+            value = 0.0
+            for k in range(indptr[row], indptr[row + 1]):
+                value += values[k] * state[indices[k]]
+            result[row] = value + offset[row]
+    return
+
+
+if HAS_NUMBA:
+    collision_kernel = numba.njit(parallel=True, cache=True)(collision_kernel)
+    transport_kernel = numba.njit(parallel=True, cache=True)(transport_kernel)
+
@@ -225,3 +225,86 @@ def energy_flow(state,
     energies = 0.5 * mass * np.sum(velocities**2, axis=1)[:, np.newaxis]
     weighted_state = state * delta_v**dim
     return np.dot(weighted_state, energies * velocities)
+
+
+def moment_matrix(delta_v,
+                  velocities,
+                  mass):
+    r"""Compute the matrix of all moments of a single specimen.
+
+    The product of a state with this matrix
+    contains the particle number, momentum, momentum flow,
+    energy and energy flow (in this order) for each space point.
+    Use :func:`moments` to compute all moments with a single product.
+
+    Parameters
+    ----------
+    delta_v : :obj:`float`
+        The physical spacing of the respective velocity grid.
+    velocities: :obj:`~numpy.ndarray` [:obj:`float`]
+        An array of all velocities.
+        Each velocity is either 2 or 3 dimensional.
+        Must be a 2D array.
+    mass : :obj:`int`
+        The particle mass of the species.
+    """
+    assert velocities.ndim == 2
+    dim = velocities.shape[1]
+    energies = 0.5 * mass * np.sum(velocities**2, axis=1)[:, np.newaxis]
+    columns = [np.full((velocities.shape[0], 1), delta_v**2),
+               mass * delta_v**2 * velocities,
+               mass * delta_v**2 * velocities**2,
+               delta_v**dim * energies,
+               delta_v**dim * energies * velocities]
+    return np.concatenate(columns, axis=1)
+
+
+def moments(state,
+            matrix,
+            mass):
+    r"""Compute all moments of the current distribution
+    with a single matrix product.
+
+    Mean velocity and temperature are derived from the
+    particle number, momentum and momentum flow.
+
+    Note
+    ----
+    Be aware that this must be computed separately for each single specimen.
+
+    Parameters
+    ----------
+    state : :obj:`~numpy.ndarray` [:obj:`float`]
+        A discretized velocity distribution function.
+        Must be 2D array.
+        For homogeneous case, add a np.newaxis.
+    matrix : :obj:`~numpy.ndarray` [:obj:`float`]
+        The :func:`moment_matrix` of the specimen.
+    mass : :obj:`int`
+        The particle mass of the species.
+
+    Returns
+    -------
+    moments : :obj:`dict` [:obj:`str`, :obj:`~numpy.ndarray`]
+        Contains all moments, the keys are named as the result datasets.
+    """
+    assert state.ndim == 2
+    dim = (matrix.shape[1] - 2) // 3
+    result = np.dot(state, matrix)
+    particle_numbers = result[:, 0]
+    momentum_ = result[:, 1: 1 + dim]
+    momentum_flow_ = result[:, 1 + dim: 1 + 2 * dim]
+    energy_ = result[:, 1 + 2 * dim]
+    energy_flow_ = result[:, 2 + 2 * dim:]
+    mean_velocities = momentum_ / (mass * particle_numbers[:, np.newaxis])
+    # sum(f |v - u|^2) = sum(f |v|^2) - n |u|^2
+    temperatures = ((np.sum(momentum_flow_, axis=1)
+                     - np.sum(momentum_ * mean_velocities, axis=1))
+                    / (dim * particle_numbers))
+    return {'particle_number': particle_numbers,
+            'mean_velocity': mean_velocities,
+            'momentum': momentum_,
+            'momentum_flow': momentum_flow_,
+            'temperature': temperatures,
+            'energy': energy_,
+            'energy_flow': energy_flow_}
@@ -137,6 +137,27 @@ class Rule(bp.BaseClass):
            and writes the results in data.results"""
         raise NotImplementedError
 
+    def transport_operator(self, data, dt=None):
+        """Returns the linear operator of :meth:`transport`.
+
+        Parameters
+        ----------
+        data : :class:`~boltzpy.Data`
+        dt : :obj:`float`, optional
+            Time step of the transport.
+            If None, then data.dt is used.
+
+        Returns
+        -------
+        matrix : :class:`~scipy.sparse.csr_matrix`
+            Sparse matrix of shape (P * V, P * V),
+            that is applied to the flattened data.state.
+            Only the rows of the :attr:`affected_points` are nonzero.
+        offset : :obj:`~numpy.array` [:obj:`float`]
+            Constant part of data.result at the :attr:`affected_points`.
+        """
+        raise NotImplementedError
+
     #####################################
     #           Visualization           #
     #####################################
@@ -430,7 +451,7 @@ class InnerPointRule(Rule):
     #            Computation            #
     #####################################
     def collision(self, data):
-        bp_cp.euler_scheme(data, self.affected_points)
+        data.collision_function(data, self.affected_points)
         return
 
     def transport(self, data):
@@ -450,6 +471,12 @@ class InnerPointRule(Rule):
         )
         return
 
+    def transport_operator(self, data, dt=None):
+        matrix = bp_cp.transport_matrix_inner(data, self.affected_points, dt)
+        offset = np.zeros((self.affected_points.size, data.vG.shape[0]),
+                          dtype=float)
+        return [matrix, offset]
+
 
 class ConstantPointRule(Rule):
     def __init__(self,
@@ -477,7 +504,7 @@ class ConstantPointRule(Rule):
     #            Computation            #
     #####################################
     def collision(self, data):
-        bp_cp.euler_scheme(data, self.affected_points)
+        data.collision_function(data, self.affected_points)
         # Todo replace by bp_cp.no_collisions(data, self.affected_points)
         # before that, implement proper initialization
         return
@@ -485,6 +512,12 @@ class ConstantPointRule(Rule):
     def transport(self, data):
         pass
 
+    def transport_operator(self, data, dt=None):
+        # the affected points keep their values in data.result
+        matrix = bp_cp.transport_matrix_none(data, self.affected_points)
+        offset = np.copy(data.result[self.affected_points])
+        return [matrix, offset]
+
 
 # Todo This is not tested!
 class BoundaryPointRule(Rule):
@@ -558,22 +591,20 @@ class BoundaryPointRule(Rule):
     @staticmethod
     def compute_reflected_indices_inverse(velocity_grids):
         reflected_indices_inverse = np.zeros(velocity_grids.size, dtype=int)
-        for (idx_v, v) in enumerate(velocity_grids.iMG):
-            spc = velocity_grids.get_specimen(idx_v)
-            v_refl = -v
-            idx_v_refl = velocity_grids.find_index(spc, v_refl)
-            reflected_indices_inverse[idx_v] = idx_v_refl
+        for (spc, [beg, end]) in enumerate(velocity_grids.index_range):
+            v_refl = -velocity_grids.iMG[beg:end]
+            idx_v_refl = velocity_grids.find_indices(spc, v_refl)
+            reflected_indices_inverse[beg:end] = idx_v_refl
         return reflected_indices_inverse
 
     @staticmethod
     def compute_reflected_indices_elastic(velocity_grids, surface_normal):
         reflected_indices_elastic = np.zeros(velocity_grids.size, dtype=int)
         # Todo only works in 1D
-        for (idx_v, v) in enumerate(velocity_grids.iMG):
-            spc = velocity_grids.get_specimen(idx_v)
-            v_refl = np.array([-1, 1]) * v
-            idx_v_refl = velocity_grids.find_index(spc, v_refl)
-            reflected_indices_elastic[idx_v] = idx_v_refl
+        for (spc, [beg, end]) in enumerate(velocity_grids.index_range):
+            v_refl = np.array([-1, 1]) * velocity_grids.iMG[beg:end]
+            idx_v_refl = velocity_grids.find_indices(spc, v_refl)
+            reflected_indices_elastic[beg:end] = idx_v_refl
         return reflected_indices_elastic
 
     def compute_initial_state(self, velocity_grids, species):
@@ -610,6 +641,20 @@ class BoundaryPointRule(Rule):
                                                                 data)
         return
 
+    def transport_operator(self, data, dt=None):
+        # the reflection is linear,
+        # thus its matrix is the reflection of the unit vectors
+        v_size = data.vG.shape[0]
+        reflection_matrix = self.reflection(np.eye(v_size), data)
+        matrix = bp_cp.transport_matrix_boundary(data,
+                                                 self.affected_points,
+                                                 self.incoming_velocities,
+                                                 reflection_matrix,
+                                                 dt)
+        offset = np.zeros((self.affected_points.size, v_size),
+                          dtype=float)
+        return [matrix, offset]
+
     def reflection(self, inflow, data):
         reflected_inflow = np.zeros(inflow.shape, dtype=float)
         # compute each reflection separately for every species
@@ -628,7 +673,7 @@ class BoundaryPointRule(Rule):
                 self.initial_state[np.newaxis, beg:end],
                 data.dv[idx_spc])
             reflected_inflow[..., beg:end] += (
-                thermal_inflow / initial_particles
+                (thermal_inflow / initial_particles)[:, np.newaxis]
                 * self.initial_state[beg:end]
             )
         return reflected_inflow
@@ -39,13 +39,20 @@ class Scheme(bp.BaseClass):
     #: :obj:`dict` [:obj:`str`, :obj:`list`]
     SUPP_VALUES = {
         "OperatorSplitting": ["FirstOrder",
+                              "SecondOrder",
                               # NoTransport
                               ],
-        "Transport": ["FiniteDifferences_FirstOrder"],
+        "Transport": ["FiniteDifferences_FirstOrder",
+                      "FiniteDifferences_FirstOrder_JIT"],
         "Collisions_Generation": ["UniformComplete",
+                                  "UniformComplete_Vectorized",
                                   # "NoCollisions",
                                   ],
         "Collisions_Computation": ["EulerScheme",
+                                   "EulerScheme_Threaded",
+                                   "EulerScheme_JIT",
+                                   "GainLoss_SemiImplicit",
+                                   "HeunScheme_Adaptive",
                                    # NoCollisions,
                                    ]
     }
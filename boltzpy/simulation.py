@@ -3,6 +3,8 @@ import h5py
 import numpy as np
 
 import boltzpy.helpers.TimeTracker as h_tt
+import boltzpy.helpers.ResultWriter as h_rw
+import boltzpy.helpers.DomainDecomposition as h_dd
 import boltzpy.AnimatedFigure as bp_af
 import boltzpy.compute as bp_cp
 import boltzpy.output as bp_o
@@ -368,13 +370,74 @@ class Simulation(bp.BaseClass):
     #     return
     # else (KeyError, AssertionError):
     def compute(self,
-                file_address=None):
-        """Compute the fully configured Simulation"""
+                file_address=None,
+                steady_state_tolerance=None,
+                steady_state_outputs=3,
+                asynchronous_output=False,
+                chunked=False,
+                compression=None,
+                shuffle=False,
+                precision="float64",
+                checkpoint_interval=None,
+                processes=None,
+                threads=None):
+        """Compute the fully configured Simulation
+
+        Parameters
+        ----------
+        file_address : :obj:`str`, optional
+        steady_state_tolerance : :obj:`float`, optional
+            If not None, then the computation stops early,
+            when a steady state is reached.
+            That is, if the relative change of the state between
+            consecutive output steps is below this tolerance
+            (see :func:`~boltzpy.compute.relative_change`).
+            The results are truncated to the written time steps.
+        steady_state_outputs : :obj:`int`, optional
+            Number of consecutive output steps,
+            that must satisfy the steady state tolerance.
+        asynchronous_output : :obj:`bool`, optional
+            If True, then the results are written by a background thread,
+            while the computation continues.
+            At most :const:`~boltzpy.constants.OUTPUT_QUEUE_SIZE`
+            output steps are pending.
+        chunked : :obj:`bool`, optional
+            If True, then each output time step of a result dataset
+            is stored as a separate HDF5 chunk.
+            Compression and filters always use this layout.
+        compression : :obj:`str`, optional
+            HDF5 compression filter of the result datasets.
+            Must be in :const:`~boltzpy.constants.SUPP_COMPRESSION`.
+        shuffle : :obj:`bool`, optional
+            If True, then the HDF5 shuffle filter is applied,
+            which usually improves the compression.
+        precision : :obj:`str`, optional
+            Storage precision of the result datasets,
+            either "float64" or "float32".
+            The computation itself always uses double precision.
+        checkpoint_interval : :obj:`int`, optional
+            If not None, then a checkpoint is written
+            after every checkpoint_interval output steps.
+            An interrupted computation can be continued
+            by :meth:`resume`.
+        processes : :obj:`int`, optional
+            If greater than 1, then the P-Grid is split into blocks,
+            that are computed in parallel by this number of processes
+            (see :class:`~boltzpy.helpers.DomainDecomposition`).
+            Adaptive time steps are not supported.
+        threads : :obj:`int`, optional
+            Number of threads of the "EulerScheme_Threaded"
+            collision kernel.
+            If None, then all cores are used.
+        """
         self.check_integrity()
         if file_address is None:
             file_address = self.file_address
+        # generate collisions first, such that they are saved as well
+        if not self.coll.is_set_up:
+            self.coll.setup(self.scheme, self.sv, self.s)
         # Save current state to a hdf file
-        self.save(file_address)
+        self.save(file_address, verify=False)
         hdf_file = h5py.File(file_address, mode="r+")
         # Prepare storage of results
         # Todo move this into separate method, replace results?
@@ -383,6 +446,15 @@ class Simulation(bp.BaseClass):
         hdf_group = hdf_file[key]
         # store index of current time step
         hdf_group.attrs["t"] = 1
+        # early termination requires resizable datasets
+        use_steady_state = steady_state_tolerance is not None
+        # storage layout of the result datasets
+        assert compression in bp_c.SUPP_COMPRESSION
+        assert precision in {"float64", "float32"}
+        use_chunks = (chunked
+                      or compression is not None
+                      or shuffle
+                      or use_steady_state)
         # set up separate subgroup for each species
         for species_name in self.s.names:
             hdf_group.create_group(species_name)
@@ -390,82 +462,302 @@ class Simulation(bp.BaseClass):
             spc_results = self.shape_of_results[species_name]
             # set up separate dataset for each moment
             for (name, shape) in spc_results.items():
+                if use_steady_state:
+                    maxshape = (None,) + shape[1:]
+                else:
+                    maxshape = None
+                # each chunk contains a single output time step
+                if use_chunks:
+                    chunks = (1,) + shape[1:]
+                else:
+                    chunks = None
                 spc_group.create_dataset(name,
                                          shape=shape,
-                                         dtype=float)
+                                         maxshape=maxshape,
+                                         chunks=chunks,
+                                         compression=compression,
+                                         shuffle=shuffle,
+                                         dtype=precision)
+
+        # Generate Computation data, without reloading the file
+        data = bp.Data.from_simulation(self)
+        data.check_stability_conditions()
+        data.threads = threads
+        self.run_computation(data,
+                             hdf_file,
+                             first_output=0,
+                             steady_state_tolerance=steady_state_tolerance,
+                             steady_state_outputs=steady_state_outputs,
+                             asynchronous_output=asynchronous_output,
+                             checkpoint_interval=checkpoint_interval,
+                             processes=processes)
+        return
 
-        # Generate Computation data
-        data = bp.Data(self.file_address)
+    def resume(self,
+               file_address=None,
+               steady_state_tolerance=None,
+               steady_state_outputs=3,
+               asynchronous_output=False,
+               checkpoint_interval=None,
+               processes=None,
+               threads=None):
+        """Continues an interrupted computation from its last checkpoint.
+
+        The :class:`Data` is rebuilt from the simulation file,
+        including its collisions.
+        The storage layout of the results is kept.
+        See :meth:`compute` for the parameters.
+        The steady state detection restarts at the checkpoint.
+        """
+        if file_address is None:
+            file_address = self.file_address
+        hdf_file = h5py.File(file_address, mode="r+")
+        checkpoint = self.load_checkpoint(hdf_file)
+        assert checkpoint is not None, (
+            "No checkpoint found in {}".format(file_address))
+        if steady_state_tolerance is not None:
+            for spc_group in hdf_file["results"].values():
+                for dataset in spc_group.values():
+                    assert dataset.maxshape[0] is None, (
+                        "Early termination requires resizable datasets")
+        data = bp.Data(file_address)
         data.check_stability_conditions()
+        data.threads = threads
+        data.state[...] = checkpoint["state"]
+        data.t = checkpoint["t"]
+        data.proposed_step_size = checkpoint["proposed_step_size"]
+        print("Resume Computation at t = {}".format(data.t))
+        self.run_computation(data,
+                             hdf_file,
+                             first_output=checkpoint["tw_idx"] + 1,
+                             steady_state_tolerance=steady_state_tolerance,
+                             steady_state_outputs=steady_state_outputs,
+                             asynchronous_output=asynchronous_output,
+                             checkpoint_interval=checkpoint_interval,
+                             processes=processes)
+        return
+
+    def run_computation(self,
+                        data,
+                        hdf_file,
+                        first_output,
+                        steady_state_tolerance=None,
+                        steady_state_outputs=3,
+                        asynchronous_output=False,
+                        checkpoint_interval=None,
+                        processes=None):
+        """Executes the time steps and writes the results,
+        beginning at the output step first_output.
+
+        Used by :meth:`compute` and :meth:`resume`.
+        """
+        hdf_group = hdf_file["results"]
+        if self.scheme.OperatorSplitting == "FirstOrder":
+            splitting = bp_cp.operator_splitting
+        elif self.scheme.OperatorSplitting == "SecondOrder":
+            splitting = bp_cp.strang_splitting
+        else:
+            msg = ('Unsupported Operator Splitting:'
+                   + '{}'.format(self.scheme.OperatorSplitting))
+            raise NotImplementedError(msg)
+        # adaptive schemes choose the size of each time step
+        is_adaptive = (self.scheme.Collisions_Computation
+                       == "HeunScheme_Adaptive")
+        use_processes = processes is not None and processes > 1
+        if use_processes and is_adaptive:
+            msg = "Adaptive time steps can not be computed in parallel"
+            raise NotImplementedError(msg)
+
+        use_steady_state = steady_state_tolerance is not None
+        if use_steady_state:
+            assert steady_state_tolerance > 0
+            assert steady_state_outputs >= 1
+            previous_state = np.copy(data.state)
+            steady_outputs = 0
+
+        if checkpoint_interval is not None:
+            assert checkpoint_interval >= 1
+
+        # checkpoints are written after the results,
+        # thus any checkpoint is consistent with the written results
+        def write_output(output_data, tw_idx, output_group):
+            self.write_results(output_data, tw_idx, output_group)
+            if (checkpoint_interval is not None
+                    and (tw_idx + 1) % checkpoint_interval == 0):
+                self.write_checkpoint(output_data,
+                                      tw_idx,
+                                      output_group.file)
+            return
+
+        # the worker processes are started before the writer thread
+        if use_processes:
+            decomposition = h_dd.DomainDecomposition(
+                data,
+                self.geometry.rules,
+                self.scheme.OperatorSplitting,
+                processes)
+
+        if asynchronous_output:
+            writer = h_rw.ResultWriter(write_output,
+                                       hdf_group,
+                                       bp_c.OUTPUT_QUEUE_SIZE)
 
         print('Start Computation:')
         time_tracker = h_tt.TimeTracker()
         # Todo this might be buggy, if data.tG changes
         # Todo e.g. in adaptive time schemes
         # Todo proposition: iterate over length?
-        for (tw_idx, tw) in enumerate(data.tG[:, 0]):
-            while data.t != tw:
-                bp_cp.operator_splitting(data,
-                                         self.geometry.transport,
-                                         self.geometry.collision)
-            self.write_results(data, tw_idx, hdf_group)
-            hdf_file.flush()
-            # print time estimate
-            time_tracker.print(tw, data.tG[-1, 0])
+        # number of written outputs, if a steady state is reached
+        steady_state_size = None
+        try:
+            for (tw_idx, tw) in enumerate(data.tG[:, 0]):
+                if tw_idx < first_output:
+                    continue
+                if use_processes:
+                    decomposition.step(data, tw - data.t)
+                while data.t != tw:
+                    if is_adaptive:
+                        bp_cp.adaptive_time_step(data,
+                                                 self.geometry.transport,
+                                                 self.geometry.collision,
+                                                 tw)
+                    else:
+                        splitting(data,
+                                  self.geometry.transport,
+                                  self.geometry.collision)
+                if asynchronous_output:
+                    writer.put(data.snapshot(), tw_idx)
+                else:
+                    write_output(data, tw_idx, hdf_group)
+                    hdf_file.flush()
+                # print time estimate
+                time_tracker.print(tw, data.tG[-1, 0])
+                # check for steady state
+                if use_steady_state and tw_idx > first_output:
+                    change = bp_cp.relative_change(previous_state, data.state)
+                    if change < steady_state_tolerance:
+                        steady_outputs += 1
+                    else:
+                        steady_outputs = 0
+                    if steady_outputs >= steady_state_outputs:
+                        print('Steady state reached at t = {}'.format(tw))
+                        steady_state_size = tw_idx + 1
+                        break
+                if use_steady_state:
+                    previous_state[...] = data.state
+        except BaseException:
+            # pending results are written, even if the computation fails,
+            # errors of the writer must not replace the original error
+            if asynchronous_output:
+                writer.close_quietly()
+            raise
+        finally:
+            if use_processes:
+                decomposition.close()
+            data.shutdown_thread_pool()
+        if asynchronous_output:
+            writer.close()
+        if steady_state_size is not None:
+            self.truncate_results(hdf_group, steady_state_size)
+            hdf_group.attrs["termination"] = "steady_state"
+        else:
+            hdf_group.attrs["termination"] = "max_time"
+        hdf_file.flush()
+        return
+
+    @staticmethod
+    def write_checkpoint(data, tw_idx, hdf_file):
+        """Writes a checkpoint of the computation to the simulation file.
+
+        The checkpoints alternate between two slots.
+        The "latest" attribute points to the last complete checkpoint
+        and is updated only after the new slot is written and flushed.
+        Thus an interruption never corrupts the latest checkpoint.
+
+        Parameters
+        ----------
+        data : :class:`Data`
+        tw_idx : :obj:`int`
+            Index of the last written output step.
+        hdf_file : :obj:`h5py.File <h5py:File>`
+        """
+        key = "checkpoint"
+        if key not in hdf_file.keys():
+            hdf_file.create_group(key)
+        hdf_group = hdf_file[key]
+        # use the slot, that is not the latest checkpoint
+        latest = hdf_group.attrs.get("latest", 1)
+        slot = str(1 - latest)
+        if slot in hdf_group.keys():
+            del hdf_group[slot]
+        slot_group = hdf_group.create_group(slot)
+        slot_group["state"] = data.state
+        slot_group.attrs["t"] = data.t
+        slot_group.attrs["tw_idx"] = tw_idx
+        slot_group.attrs["proposed_step_size"] = data.proposed_step_size
+        hdf_file.flush()
+        hdf_group.attrs["latest"] = 1 - latest
+        hdf_file.flush()
+        return
+
+    @staticmethod
+    def load_checkpoint(hdf_file):
+        """Returns the latest checkpoint of the simulation file,
+        or None if there is no checkpoint.
+
+        Parameters
+        ----------
+        hdf_file : :obj:`h5py.File <h5py:File>`
+
+        Returns
+        -------
+        checkpoint : :obj:`dict`
+            Contains the state, the time step t,
+            the index of the last written output step tw_idx
+            and the proposed_step_size of adaptive schemes.
+        """
+        key = "checkpoint"
+        if key not in hdf_file.keys():
+            return None
+        hdf_group = hdf_file[key]
+        if "latest" not in hdf_group.attrs.keys():
+            return None
+        slot_group = hdf_group[str(hdf_group.attrs["latest"])]
+        checkpoint = {"state": slot_group["state"][()],
+                      "t": int(slot_group.attrs["t"]),
+                      "tw_idx": int(slot_group.attrs["tw_idx"]),
+                      "proposed_step_size":
+                          int(slot_group.attrs["proposed_step_size"])}
+        return checkpoint
+
+    @staticmethod
+    def truncate_results(hdf_group, size):
+        """Truncates all result datasets to the first size time steps.
+
+        Parameters
+        ----------
+        hdf_group : :obj:`h5py.Group <h5py:Group>`
+            The results group.
+            All datasets must be resizable in their first dimension.
+        size : :obj:`int`
+        """
+        for spc_group in hdf_group.values():
+            for dataset in spc_group.values():
+                dataset.resize(size, axis=0)
+        hdf_group.attrs["t"] = size
         return
 
     def write_results(self, data, tw_idx, hdf_group):
         for (s, species_name) in enumerate(self.s.names):
             (beg, end) = self.sv.index_range[s]
             spc_state = data.state[..., beg:end]
-            dv = self.sv.vGrids[s].physical_spacing
-            mass = self.s.mass[s]
-            velocities = self.sv.vGrids[s].pG
             spc_group = hdf_group[species_name]
-            # particle_number
-            particle_number = bp_o.particle_number(spc_state, dv)
-            spc_group["particle_number"][tw_idx] = particle_number
-
-            # mean velocity
-            mean_velocity = bp_o.mean_velocity(spc_state,
-                                               dv,
-                                               velocities,
-                                               particle_number)
-            spc_group["mean_velocity"][tw_idx] = mean_velocity
-
-            # temperature
-            temperature = bp_o.temperature(spc_state,
-                                           dv,
-                                           velocities,
-                                           mass,
-                                           particle_number,
-                                           mean_velocity)
-            spc_group["temperature"][tw_idx] = temperature
-
-            # momentum
-            spc_group["momentum"][tw_idx] = bp_o.momentum(
-                spc_state,
-                dv,
-                velocities,
-                mass)
-            # momentum flow
-            spc_group["momentum_flow"][tw_idx] = bp_o.momentum_flow(
-                spc_state,
-                dv,
-                velocities,
-                mass)
-            # energy
-            spc_group["energy"][tw_idx] = bp_o.energy(
-                spc_state,
-                dv,
-                velocities,
-                mass)
-            # energy flow
-            spc_group["energy_flow"][tw_idx] = bp_o.energy_flow(
-                spc_state,
-                dv,
-                velocities,
-                mass)
+            # all moments are computed by a single matrix product
+            moments = bp_o.moments(spc_state,
+                                   data.moment_matrices[s],
+                                   self.s.mass[s])
+            for (name, value) in moments.items():
+                spc_group[name][tw_idx] = value
         # update index of current time step
         hdf_group.attrs["t"] = tw_idx + 1
         return
@@ -559,7 +851,7 @@ class Simulation(bp.BaseClass):
         self.check_integrity(complete_check=False)
         return self
 
-    def save(self, file_address=None):
+    def save(self, file_address=None, verify=True):
         """Write all parameters of the :class:`Simulation` instance
         to a HDF5 file.
 
@@ -570,6 +862,10 @@ class Simulation(bp.BaseClass):
             If it is a base file name or a file root,
             then the file is placed in the
             :attr:`~Simulation.default_directory`.
+        verify : :obj:`bool`, optional
+            If True, then the file is loaded again
+            and compared to the instance.
+            The :class:`Collisions` are only reloaded, if True.
         """
         # Change Simulation.file_name, if file_address is given
         if file_address is None:
@@ -613,7 +909,7 @@ class Simulation(bp.BaseClass):
         # Save Collisions
         key = "Collisions"
         file.create_group(key)
-        self.coll.save(file[key])
+        self.coll.save(file[key], verify=verify)
 
         # Save Scheme
         key = "Scheme"
@@ -628,14 +924,15 @@ class Simulation(bp.BaseClass):
                                  dtype=h5py_string_type).flatten()
             file[key].attrs["shape"] = self.output_parameters.shape
 
-        # assert that the instance can be reconstructed from the save
-        other = self.load(file_address)
-        # if a different file name is given then, the check MUST fail
-        if file_address == self.file_address:
-            assert self == other
-        else:
-            assert not self == other
         file.close()
+        if verify:
+            # assert that the instance can be reconstructed from the save
+            other = self.load(file_address)
+            # if a different file name is given then, the check MUST fail
+            if file_address == self.file_address:
+                assert self == other
+            else:
+                assert not self == other
         return
 
     #####################################
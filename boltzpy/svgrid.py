@@ -226,6 +226,31 @@ class SVGrid(bp.BaseClass):
             assert np.all(self.iMG[global_index] == integer_value)
             return global_index
 
+    def find_indices(self,
+                     index_of_specimen,
+                     integer_values):
+        """Find the indices of several grid entries in :attr:`iMG`.
+        Returns -1 for each value that is not in the specified Grid.
+
+        Parameters
+        ----------
+        index_of_specimen : :obj:`int`
+        integer_values : :obj:`~numpy.array` [:obj:`int`]
+            Array of shape (number_of_values, :attr:`ndim`).
+
+        Returns
+        -------
+        global_indices : :obj:`~numpy.array` [:obj:`int`]
+            Array of shape (number_of_values,).
+        """
+        local_indices = self.vGrids[index_of_specimen].get_indices(
+            integer_values)
+        index_offset = self.index_range[index_of_specimen, 0]
+        global_indices = np.where(local_indices == -1,
+                                  -1,
+                                  local_indices + index_offset)
+        return global_indices
+
     # Todo should be faster with next()
     # Todo change name
     # Todo delete - is it used anywhere?
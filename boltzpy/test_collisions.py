@@ -1,8 +1,11 @@
+import os
+
 import h5py
 import numpy as np
 import pytest
 
 import boltzpy.testcase as bp_t
+import boltzpy.constants as bp_c
 import boltzpy as bp
 
 
@@ -18,3 +21,210 @@ def test_collisions(tc):
     assert np.array_equal(old_coll.relations, new_coll.relations)
     assert np.array_equal(old_coll.weights, new_coll.weights)
     return
+
+
+@pytest.mark.parametrize("tc", bp_t.CASES)
+def test_vectorized_generation(tc):
+    scheme = bp.Scheme(Collisions_Generation="UniformComplete_Vectorized")
+    new_coll = bp.Collisions()
+    new_coll.setup(scheme=scheme,
+                   svgrid=tc.sv,
+                   species=tc.s,
+                   use_cache=False)
+    # compare results
+    assert tc.coll.size == new_coll.size
+    assert np.array_equal(tc.coll.relations, new_coll.relations)
+    assert np.array_equal(tc.coll.weights, new_coll.weights)
+    return
+
+
+@pytest.mark.parametrize("tc", bp_t.CASES)
+def test_parallel_generation(tc):
+    scheme = bp.Scheme(Collisions_Generation="UniformComplete_Vectorized")
+    # unfiltered collisions must be in the same order as well
+    serial_coll = bp.Collisions()
+    serial_coll.setup(scheme=scheme,
+                      svgrid=tc.sv,
+                      species=tc.s,
+                      apply_filter=False,
+                      use_cache=False)
+    parallel_coll = bp.Collisions()
+    parallel_coll.setup(scheme=scheme,
+                        svgrid=tc.sv,
+                        species=tc.s,
+                        apply_filter=False,
+                        use_cache=False,
+                        workers=3)
+    assert np.array_equal(serial_coll.relations, parallel_coll.relations)
+    assert np.array_equal(serial_coll.weights, parallel_coll.weights)
+    return
+
+
+@pytest.mark.parametrize("tc", bp_t.CASES)
+def test_collision_cache(tc, tmp_path, monkeypatch):
+    monkeypatch.setattr(bp_c, "COLLISION_CACHE_DIRECTORY", str(tmp_path))
+    cache = bp.CollisionCache()
+    key = cache.fingerprint(tc.scheme, tc.sv, tc.s)
+    assert cache.load(key) is None
+    # the first setup fills the cache, the second setup reads it
+    for _ in range(2):
+        new_coll = bp.Collisions()
+        new_coll.setup(scheme=tc.scheme, svgrid=tc.sv, species=tc.s)
+        assert new_coll == tc.coll
+    assert cache.load(key) == tc.coll
+    # a different collision rate must not use the same entry
+    species = bp.Species()
+    for (idx, specimen) in enumerate(tc.s.specimen_arr):
+        species.add(mass=specimen.mass,
+                    collision_rate=2 * specimen.collision_rate[:idx + 1])
+    assert cache.fingerprint(tc.scheme, tc.sv, species) != key
+    # entries are evicted, if the cache is too large
+    small_cache = bp.CollisionCache(max_size=0)
+    small_cache.evict()
+    assert small_cache.entries == []
+    return
+
+
+@pytest.mark.parametrize("tc", bp_t.CASES)
+def test_collision_cache_concurrent_eviction(tc, tmp_path, monkeypatch):
+    cache = bp.CollisionCache(directory=str(tmp_path), max_size=0)
+    for key in ["first", "second"]:
+        with h5py.File(cache.file_address(key), mode="w") as file:
+            tc.coll.save(file)
+    # unfinished saves of other processes are no entries
+    tmp_address = cache.file_address("third") + ".1.tmp"
+    open(tmp_address, "w").close()
+    assert len(cache.entries) == 2
+    # another simulation removes the entries, after they are listed
+    getsize = os.path.getsize
+
+    def concurrent_getsize(file_address):
+        size = getsize(file_address)
+        os.remove(file_address)
+        return size
+
+    monkeypatch.setattr(os.path, "getsize", concurrent_getsize)
+    cache.evict()
+    monkeypatch.setattr(os.path, "getsize", getsize)
+    assert cache.entries == []
+    assert os.path.exists(tmp_address)
+    return
+
+
+@pytest.mark.parametrize("tc", bp_t.CASES)
+@pytest.mark.parametrize("dt", [1, 0.25])
+def test_collision_matrix(tc, dt):
+    col_mat = tc.coll.generate_collision_matrix(dt)
+    # dense reference implementation
+    rows = np.max(tc.coll.relations) + 1
+    expected = np.zeros((rows, tc.coll.size), dtype=float)
+    for [i_col, col] in enumerate(tc.coll.relations):
+        expected[col, i_col] = dt * tc.coll.weights[i_col] * np.array(
+            [-1, 1, -1, 1])
+    assert col_mat.shape == expected.shape
+    assert np.allclose(col_mat.toarray(), expected, rtol=1e-15, atol=0)
+    return
+
+
+@pytest.mark.parametrize("tc", bp_t.CASES)
+def test_collision_invariants(tc):
+    mat = tc.coll.generate_collision_matrix()
+    # reference: rank of the dense matrix
+    rank = np.linalg.matrix_rank(mat.toarray())
+    assert tc.coll.number_of_collision_invariants == mat.shape[0] - rank
+    basis = tc.coll.collision_invariants()
+    assert basis.shape == (mat.shape[0] - rank, mat.shape[0])
+    # each invariant is conserved by all collisions
+    assert np.allclose(mat.T.dot(basis.T), 0, atol=1e-10)
+    # number density is a collision invariant
+    number_density = np.ones(mat.shape[0])
+    projection = basis.T.dot(basis.dot(number_density))
+    assert np.allclose(projection, number_density)
+    return
+
+
+@pytest.mark.parametrize("tc", bp_t.CASES)
+def test_filter_collisions(tc):
+    coll = bp.Collisions()
+    coll.setup(scheme=tc.scheme,
+               svgrid=tc.sv,
+               species=tc.s,
+               apply_filter=False,
+               use_cache=False)
+    # reference: keep the first collision of each index key
+    expected = dict()
+    for (idx, rel) in enumerate(coll.relations):
+        expected.setdefault(tuple(np.sort(rel)), idx)
+    indices = bp.collisions.filter_collisions(coll.relations)
+    assert np.array_equal(indices, list(expected.values()))
+    assert np.array_equal(coll.relations[indices], tc.coll.relations)
+    return
+
+
+@pytest.mark.parametrize("tc", bp_t.CASES)
+@pytest.mark.parametrize("mode", ["index", "area", "angle"])
+def test_sort_and_group_collisions(tc, mode):
+    collisions = tc.coll.collisions
+    key_functions = {
+        "index": lambda c: c.key_index(),
+        "area": lambda c: c.key_area(tc.sv),
+        "angle": lambda c: c.key_angle(tc.sv)}
+    get_key = key_functions[mode]
+    # reference: sort and group the Collision objects
+    expected_order = sorted(range(tc.coll.size),
+                            key=lambda i: get_key(collisions[i]))
+    expected_groups = dict()
+    for (idx, coll) in enumerate(collisions):
+        key = tuple(np.array(get_key(coll)).tolist())
+        expected_groups.setdefault(key, []).append(idx)
+    order = bp.collisions.sort_collisions(tc.coll.relations, tc.sv, mode)
+    assert np.array_equal(order, expected_order)
+    groups = bp.collisions.group_collisions(tc.coll.relations, tc.sv, mode)
+    assert list(groups.keys()) == list(expected_groups.keys())
+    for (key, indices) in groups.items():
+        assert np.array_equal(indices, expected_groups[key])
+    return
+
+
+@pytest.mark.parametrize("tc", bp_t.CASES)
+def test_check_integrity(tc):
+    tc.coll.check_integrity(context=tc, level="full")
+    coll = bp.Collisions()
+    # a velocity without a collision partner violates momentum conservation
+    coll.relations = np.copy(tc.coll.relations)
+    coll.weights = np.copy(tc.coll.weights)
+    coll.relations[0, 3] = coll.relations[0, 2]
+    coll.check_integrity(context=tc, level="basic")
+    with pytest.raises(AssertionError):
+        coll.check_integrity(context=tc, level="full")
+    # non-positive weights
+    coll.relations = np.copy(tc.coll.relations)
+    coll.weights[-1] = 0.0
+    with pytest.raises(AssertionError):
+        coll.check_integrity(level="basic")
+    # velocity indices out of range are found with a context
+    coll.weights = np.copy(tc.coll.weights)
+    coll.relations[-1, 3] = tc.sv.size
+    coll.check_integrity(level="basic")
+    with pytest.raises(AssertionError):
+        coll.check_integrity(context=tc, level="basic")
+    return
+
+
+@pytest.mark.parametrize("tc", bp_t.CASES)
+@pytest.mark.parametrize("mode", ["area", "angle"])
+def test_reduce_keeps_invariants(tc, mode):
+    coll = bp.Collisions()
+    coll.relations = np.copy(tc.coll.relations)
+    coll.weights = np.copy(tc.coll.weights)
+    coll.reduce(tc.sv, mode)
+    assert 0 < coll.size < tc.coll.size
+    # the reduced collisions are a subset of the complete ones
+    complete_relations = {tuple(rel) for rel in tc.coll.relations}
+    assert all(tuple(rel) in complete_relations for rel in coll.relations)
+    assert np.isclose(np.sum(coll.weights), np.sum(tc.coll.weights))
+    size = tc.sv.size
+    assert (coll.collision_invariants(size).shape[0]
+            == tc.coll.collision_invariants(size).shape[0])
+    coll.check_integrity(context=tc, level="full")
+    return
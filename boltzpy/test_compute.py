@@ -0,0 +1,583 @@
+import threading
+
+import h5py
+import numpy as np
+import pytest
+
+import boltzpy.testcase as bp_t
+import boltzpy.compute as bp_cp
+import boltzpy.jit as bp_jit
+import boltzpy.constants as bp_c
+import boltzpy.helpers.ResultWriter as h_rw
+import boltzpy.helpers.DomainDecomposition as h_dd
+import boltzpy as bp
+
+
+def _make_case(tc, tmp_path, name, **scheme_overrides):
+    """Returns a copy of the TestCase tc, stored in tmp_path / name.
+    The parameters of its :class:`Scheme` can be overridden."""
+    scheme_params = {key: getattr(tc.scheme, key)
+                     for key in ["OperatorSplitting",
+                                 "Transport",
+                                 "Transport_VelocityOffset",
+                                 "Collisions_Generation",
+                                 "Collisions_Computation"]}
+    scheme_params.update(scheme_overrides)
+    return bp_t.TestCase(str(tmp_path / name),
+                         s=tc.s,
+                         sv=tc.sv,
+                         coll=tc.coll,
+                         scheme=bp.Scheme(**scheme_params))
+
+
+def _results(file_address):
+    return h5py.File(file_address, mode="r")["results"]
+
+
+def _assert_results_equal(group_a, group_b, **allclose_kwargs):
+    """Compares all result datasets of both groups.
+    Without allclose_kwargs, the results must be bitwise equal."""
+    assert set(group_a.keys()) == set(group_b.keys())
+    for (species_name, spc_group) in group_b.items():
+        assert set(group_a[species_name].keys()) == set(spc_group.keys())
+        for (name, dataset) in spc_group.items():
+            result = group_a[species_name][name][()]
+            if allclose_kwargs:
+                assert np.allclose(result, dataset[()], **allclose_kwargs)
+            else:
+                assert np.array_equal(result, dataset[()])
+    return
+
+
+def euler_scheme_pointwise(data, affected_points):
+    """Reference implementation, computes each point separately"""
+    for p in affected_points:
+        u_c0 = data.state[p, data.col[:, 0]]
+        u_c1 = data.state[p, data.col[:, 1]]
+        u_c2 = data.state[p, data.col[:, 2]]
+        u_c3 = data.state[p, data.col[:, 3]]
+        col_factor = (np.multiply(u_c0, u_c2) - np.multiply(u_c1, u_c3))
+        data.state[p] += data.dt * data.unit_col_mat.dot(col_factor)
+    return
+
+
+@pytest.mark.parametrize("tf", bp_t.FILES)
+@pytest.mark.parametrize("batch_size", [1, 2**22])
+def test_euler_scheme_is_pointwise(tf, batch_size, monkeypatch):
+    # batch_size = 1 processes each point separately
+    monkeypatch.setattr(bp_c, "COLLISION_BATCH_SIZE", batch_size)
+    data = bp.Data(tf)
+    affected_points = np.arange(1, data.p_size - 1)
+    initial_state = np.copy(data.state)
+    # compute several steps with the reference implementation
+    for _ in range(3):
+        euler_scheme_pointwise(data, affected_points)
+    expected_state = data.state
+    data.state = initial_state
+    for _ in range(3):
+        bp_cp.euler_scheme(data, affected_points)
+    assert np.array_equal(data.state, expected_state)
+    return
+
+
+@pytest.mark.parametrize("tf", bp_t.FILES)
+def test_transport_operator_equals_rules(tf):
+    sim = bp.Simulation.load(tf)
+    data = bp.Data(tf)
+    data.state = np.random.random(data.state.shape)
+    initial_result = np.copy(data.result)
+    # compute transport separately for each rule
+    for rule in sim.geometry.rules:
+        rule.transport(data)
+    expected_result = np.copy(data.result)
+    # compute transport by the precomputed operator
+    data.result[...] = initial_result
+    sim.geometry.transport(data)
+    assert np.allclose(data.result, expected_result, rtol=1e-12, atol=0)
+    assert np.array_equal(data.state, data.result)
+    return
+
+
+@pytest.mark.parametrize("tc", bp_t.CASES)
+def test_second_order_splitting(tc, tmp_path):
+    sim = _make_case(tc, tmp_path, "strang", OperatorSplitting="SecondOrder")
+    sim.save()
+    data = bp.Data(sim.file_address)
+    assert data.transport_dt == data.dt / 2
+    initial_state = np.copy(data.state)
+    initial_result = np.copy(data.result)
+
+    def half_transport():
+        for rule in sim.geometry.rules:
+            rule.transport(data)
+        data.state[...] = data.result
+        return
+
+    # reference: use half transport steps of the rules
+    base_dt = data.dt
+    data.dt = data.transport_dt
+    half_transport()
+    data.dt = base_dt
+    sim.geometry.collision(data)
+    data.dt = data.transport_dt
+    half_transport()
+    expected_state = np.copy(data.state)
+    # compute a single time step
+    data.dt = base_dt
+    data.state[...] = initial_state
+    data.result[...] = initial_result
+    bp_cp.strang_splitting(data,
+                           sim.geometry.transport,
+                           sim.geometry.collision)
+    assert data.t == 1
+    assert np.allclose(data.state, expected_state, rtol=1e-12, atol=0)
+    # the computation of the whole simulation must work as well
+    sim.compute()
+    return
+
+
+@pytest.mark.parametrize("tf", bp_t.FILES)
+def test_set_step_size(tf):
+    data = bp.Data(tf)
+    sim = bp.Simulation.load(tf)
+    base_dt = data.dt
+    unit_col_mat = data.unit_col_mat
+    assert data.max_step_size >= 1
+    for step_size in [2, 1, 3, 2]:
+        data.set_step_size(step_size)
+        assert data.step_size == step_size
+        assert np.isclose(data.dt, step_size * base_dt)
+        # the collision matrix is never copied
+        assert data.unit_col_mat is unit_col_mat
+        [matrix, offset] = sim.geometry.transport_operator(data, data.dt)
+        assert np.allclose(data.transport_mat.toarray(), matrix.toarray())
+        assert np.array_equal(data.transport_offset, offset)
+    # only the transport operators are cached
+    assert set(data.transport_operators.keys()) == {1, 2, 3}
+    return
+
+
+def compute_adaptive_steps(tc, data):
+    """Computes all time steps and returns the step sizes"""
+    step_sizes = []
+    for tw in data.tG[:, 0]:
+        while data.t != tw:
+            t = data.t
+            bp_cp.adaptive_time_step(data,
+                                     tc.geometry.transport,
+                                     tc.geometry.collision,
+                                     tw)
+            # time steps must not skip any output time
+            assert t < data.t <= tw
+            assert data.t - t == data.step_size
+            assert data.step_size <= data.max_step_size
+            step_sizes.append(data.step_size)
+    return step_sizes
+
+
+@pytest.mark.parametrize("tc", bp_t.CASES)
+@pytest.mark.parametrize("tolerance", [1e-8, bp_c.ADAPTIVE_TOLERANCE])
+def test_adaptive_time_step(tc, tolerance, monkeypatch):
+    monkeypatch.setattr(bp_c, "ADAPTIVE_TOLERANCE", tolerance)
+    data = bp.Data(tc.file_address)
+    assert data.tolerance == tolerance
+    step_sizes = compute_adaptive_steps(tc, data)
+    assert data.t == data.tG[-1, 0]
+    assert np.all(data.state >= 0)
+    if tolerance == 1e-8:
+        # tiny tolerances enforce the fixed time step euler scheme
+        assert set(step_sizes) == {1}
+        fixed_data = bp.Data(tc.file_address)
+        while fixed_data.t != data.t:
+            bp_cp.operator_splitting(fixed_data,
+                                     tc.geometry.transport,
+                                     tc.geometry.collision)
+        assert np.allclose(data.state, fixed_data.state, rtol=1e-6)
+    return
+
+
+def test_adaptive_time_step_grows():
+    tc = bp_t.CASES[0]
+    data = bp.Data(tc.file_address)
+    data.tolerance = 1e-1
+    step_sizes = compute_adaptive_steps(tc, data)
+    assert max(step_sizes) > 1
+    assert len(step_sizes) < data.tG[-1, 0]
+    return
+
+
+def test_relative_change():
+    state = np.ones((3, 4))
+    assert bp_cp.relative_change(state, state) == 0
+    assert bp_cp.relative_change(state, 1.5 * state) == 0.5
+    zeros = np.zeros((3, 4))
+    assert bp_cp.relative_change(zeros, zeros) == 0
+    assert bp_cp.relative_change(zeros, state) == np.inf
+    return
+
+
+@pytest.mark.parametrize("tolerance", [1.0, 1e-12])
+def test_steady_state_termination(tolerance, tmp_path):
+    tc = bp_t.CASES[0]
+    sim = _make_case(tc, tmp_path, "steady_state")
+    sim.compute(steady_state_tolerance=tolerance,
+                steady_state_outputs=2)
+    hdf_group = _results(sim.file_address)
+    if tolerance == 1.0:
+        # the first output has no predecessor
+        expected_size = 3
+        assert hdf_group.attrs["termination"] == "steady_state"
+    else:
+        expected_size = sim.t.size
+        assert hdf_group.attrs["termination"] == "max_time"
+    assert hdf_group.attrs["t"] == expected_size
+    for spc_group in hdf_group.values():
+        for dataset in spc_group.values():
+            assert dataset.shape[0] == expected_size
+    return
+
+
+@pytest.mark.parametrize("tf", bp_t.FILES)
+def test_data_snapshot(tf):
+    data = bp.Data(tf)
+    snapshot = data.snapshot()
+    assert np.array_equal(snapshot.state, data.state)
+    assert snapshot.unit_col_mat is data.unit_col_mat
+    # further computations do not change the snapshot
+    data.state += 1
+    assert not np.array_equal(snapshot.state, data.state)
+    with pytest.raises(AttributeError):
+        _ = data.undefined_parameter
+    return
+
+
+def test_asynchronous_output(tmp_path):
+    tc = bp_t.CASES[0]
+    groups = []
+    for asynchronous_output in [False, True]:
+        sim = _make_case(tc, tmp_path, str(asynchronous_output))
+        sim.compute(asynchronous_output=asynchronous_output)
+        groups.append(_results(sim.file_address))
+    [sync_group, async_group] = groups
+    assert async_group.attrs["t"] == sync_group.attrs["t"]
+    _assert_results_equal(async_group, sync_group)
+    return
+
+
+def test_result_writer_raises_errors(tmp_path):
+    def failing_write(data, tw_idx, hdf_group):
+        raise ValueError("write failed")
+
+    hdf_file = h5py.File(str(tmp_path / "writer.hdf5"), mode="w")
+    writer = h_rw.ResultWriter(failing_write, hdf_file, queue_size=1)
+    writer.put(None, 0)
+    with pytest.raises(ValueError):
+        writer.close()
+    return
+
+
+def test_computation_error_is_not_replaced(tmp_path, monkeypatch):
+    tc = bp_t.CASES[0]
+    sim = _make_case(tc, tmp_path, "failing")
+    write_failed = threading.Event()
+
+    def failing_write(data, tw_idx, hdf_group):
+        write_failed.set()
+        raise ValueError("write failed")
+
+    def interrupted_splitting(data, func_transport, func_collision):
+        # the writer fails before the computation
+        assert write_failed.wait(timeout=10)
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(sim, "write_results", failing_write)
+    monkeypatch.setattr(bp_cp, "operator_splitting", interrupted_splitting)
+    # the original error is raised, not the error of the writer
+    with pytest.raises(KeyboardInterrupt):
+        sim.compute(asynchronous_output=True)
+    return
+
+
+@pytest.mark.parametrize("compression", [None, "gzip", "lzf"])
+@pytest.mark.parametrize("precision", ["float64", "float32"])
+def test_result_storage(compression, precision, tmp_path):
+    tc = bp_t.CASES[0]
+    sim = _make_case(tc, tmp_path, "storage")
+    sim.compute(chunked=True,
+                compression=compression,
+                shuffle=compression is not None,
+                precision=precision)
+    hdf_group = _results(sim.file_address)
+    for spc_group in hdf_group.values():
+        for dataset in spc_group.values():
+            assert dataset.dtype == np.dtype(precision)
+            assert dataset.compression == compression
+            # a single chunk per output time step
+            assert dataset.chunks == (1,) + dataset.shape[1:]
+    _assert_results_equal(hdf_group,
+                          _results(tc.file_address),
+                          rtol=1e-6,
+                          atol=1e-6)
+    return
+
+
+@pytest.mark.parametrize("asynchronous_output", [False, True])
+def test_resume_from_checkpoint(asynchronous_output, tmp_path, monkeypatch):
+    tc = bp_t.CASES[0]
+    # uninterrupted computation
+    sim = _make_case(tc, tmp_path, "reference")
+    sim.compute()
+    expected = _results(sim.file_address)
+
+    # interrupt the computation between the 3rd and 4th output
+    operator_splitting = bp_cp.operator_splitting
+
+    def interrupted_splitting(data, func_transport, func_collision):
+        if data.t == sim.t.iG[2, 0] + 1:
+            raise KeyboardInterrupt
+        operator_splitting(data, func_transport, func_collision)
+        return
+
+    sim = _make_case(tc, tmp_path, "interrupted")
+    monkeypatch.setattr(bp_cp, "operator_splitting", interrupted_splitting)
+    with pytest.raises(KeyboardInterrupt):
+        sim.compute(checkpoint_interval=1,
+                    asynchronous_output=asynchronous_output)
+    monkeypatch.setattr(bp_cp, "operator_splitting", operator_splitting)
+    with h5py.File(sim.file_address, mode="r") as hdf_file:
+        checkpoint = sim.load_checkpoint(hdf_file)
+        assert checkpoint["tw_idx"] == 2
+        assert checkpoint["t"] == sim.t.iG[2, 0]
+        # both checkpoint slots are used
+        assert set(hdf_file["checkpoint"].keys()) == {"0", "1"}
+
+    sim.resume(asynchronous_output=asynchronous_output)
+    result = _results(sim.file_address)
+    assert result.attrs["t"] == sim.t.size
+    _assert_results_equal(result, expected)
+    return
+
+
+@pytest.mark.parametrize("tf", bp_t.FILES)
+def test_data_from_simulation(tf):
+    sim = bp.Simulation.load(tf)
+    data = bp.Data.from_simulation(sim)
+    expected = bp.Data(tf)
+    assert np.array_equal(data.state, expected.state)
+    assert np.array_equal(data.col, expected.col)
+    assert np.array_equal(data.unit_col_mat.toarray(),
+                          expected.unit_col_mat.toarray())
+    assert np.array_equal(data.transport_mat.toarray(),
+                          expected.transport_mat.toarray())
+    assert np.array_equal(data.transport_offset, expected.transport_offset)
+    for (matrix, expected_matrix) in zip(data.moment_matrices,
+                                         expected.moment_matrices):
+        assert np.array_equal(matrix, expected_matrix)
+    return
+
+
+def test_compute_to_other_file(tmp_path):
+    tc = bp_t.CASES[0]
+    sim = _make_case(tc, tmp_path, "original")
+    other_address = str(tmp_path / "other.hdf5")
+    sim.compute(other_address)
+    _assert_results_equal(_results(other_address),
+                          _results(tc.file_address),
+                          rtol=1e-5)
+    return
+
+
+def test_compute_does_not_reload_collisions(tmp_path, monkeypatch):
+    monkeypatch.setattr(bp_c, "COLLISION_CACHE_DIRECTORY",
+                        str(tmp_path / "cache"))
+    tc = bp_t.CASES[0]
+    # the collisions are generated and cached during compute()
+    sim = _make_case(tc, tmp_path, "no_reload")
+    sim.coll = bp.Collisions()
+
+    def load(hdf5_group):
+        raise AssertionError("Collisions are reloaded")
+
+    monkeypatch.setattr(bp.Collisions, "load", staticmethod(load))
+    sim.compute()
+    assert sim.coll == tc.coll
+    return
+
+
+@pytest.mark.parametrize("tc", bp_t.CASES)
+@pytest.mark.parametrize("operator_splitting", ["FirstOrder", "SecondOrder"])
+def test_parallel_computation(tc, operator_splitting, tmp_path):
+    groups = []
+    for processes in [None, 3]:
+        sim = _make_case(tc, tmp_path, str(processes),
+                         OperatorSplitting=operator_splitting)
+        sim.compute(processes=processes)
+        groups.append(_results(sim.file_address))
+    [serial_group, parallel_group] = groups
+    # the parallel computation is bitwise equal
+    _assert_results_equal(parallel_group, serial_group)
+    return
+
+
+def test_parallel_computation_raises_errors():
+    tc = bp_t.CASES[0]
+    data = bp.Data(tc.file_address)
+    # negative states are detected by the workers
+    data.state[...] = -1
+    decomposition = h_dd.DomainDecomposition(data,
+                                             tc.geometry.rules,
+                                             "FirstOrder",
+                                             processes=2)
+    try:
+        with pytest.raises(AssertionError):
+            decomposition.step(data, 1)
+    finally:
+        decomposition.close()
+    # further calls have no effect
+    decomposition.close()
+    return
+
+
+@pytest.mark.parametrize("tf", bp_t.FILES)
+@pytest.mark.parametrize("threads", [1, 2, 3])
+def test_euler_scheme_threaded(tf, threads):
+    data = bp.Data(tf)
+    data.threads = threads
+    affected_points = np.arange(1, data.p_size - 1)
+    initial_state = np.copy(data.state)
+    for _ in range(3):
+        bp_cp.euler_scheme(data, affected_points)
+    expected_state = data.state
+    data.state = initial_state
+    for _ in range(3):
+        bp_cp.euler_scheme_threaded(data, affected_points)
+    assert np.array_equal(data.state, expected_state)
+    data.shutdown_thread_pool()
+    assert data.thread_pool is None
+    return
+
+
+def test_threaded_computation(tmp_path):
+    tc = bp_t.CASES[0]
+    groups = []
+    for computation in ["EulerScheme", "EulerScheme_Threaded"]:
+        sim = _make_case(tc, tmp_path, computation,
+                         Collisions_Computation=computation)
+        active_threads = threading.active_count()
+        sim.compute(threads=2)
+        # the threads are stopped after the computation
+        assert threading.active_count() == active_threads
+        groups.append(_results(sim.file_address))
+    [serial_group, threaded_group] = groups
+    _assert_results_equal(threaded_group, serial_group)
+    return
+
+
+@pytest.mark.parametrize("tf", bp_t.FILES)
+def test_jit_kernels(tf):
+    # without Numba, the kernels are executed as plain Python
+    data = bp.Data(tf)
+    affected_points = np.arange(1, data.p_size - 1)
+    initial_state = np.copy(data.state)
+    bp_cp.euler_scheme(data, affected_points)
+    expected_state = np.copy(data.state)
+    data.state[...] = initial_state
+    bp_jit.collision_kernel(data.state,
+                            affected_points,
+                            data.col,
+                            data.dt * data.weight)
+    assert np.allclose(data.state, expected_state, rtol=1e-12, atol=1e-15)
+    # transport kernel
+    data.state = np.random.random(data.state.shape)
+    bp_cp.apply_transport_operator(data)
+    expected_result = np.copy(data.result)
+    data.result[...] = 0
+    bp_jit.transport_kernel(data.transport_mat.indptr,
+                            data.transport_mat.indices,
+                            data.transport_mat.data,
+                            data.state.reshape(-1),
+                            data.transport_offset.reshape(-1),
+                            data.result.reshape(-1),
+                            data.state.shape[1])
+    assert np.allclose(data.result, expected_result, rtol=1e-12, atol=1e-15)
+    return
+
+
+def test_jit_computation(tmp_path):
+    tc = bp_t.CASES[0]
+    sim = _make_case(tc, tmp_path, "jit",
+                     Transport="FiniteDifferences_FirstOrder_JIT",
+                     Collisions_Computation="EulerScheme_JIT")
+    sim.compute()
+    _assert_results_equal(_results(sim.file_address),
+                          _results(tc.file_address),
+                          rtol=1e-10,
+                          atol=1e-12)
+    return
+
+
+def gain_loss_data(file_address):
+    """Data of the given file, using the gain/loss collision operator"""
+    sim = bp.Simulation.load(file_address)
+    sim.scheme.Collisions_Computation = "GainLoss_SemiImplicit"
+    return bp.Data.from_simulation(sim)
+
+
+@pytest.mark.parametrize("tf", bp_t.FILES)
+def test_gain_loss_operators(tf):
+    data = gain_loss_data(tf)
+    assert data.collision_function is bp_cp.gain_loss_scheme
+    [gain_pre, gain_post, loss] = data.gain_loss_operators
+    state = np.random.random((3, data.state.shape[1]))
+    product_pre = state[:, data.col[:, 0]] * state[:, data.col[:, 2]]
+    product_post = state[:, data.col[:, 1]] * state[:, data.col[:, 3]]
+    gain = (gain_pre.dot(product_pre.T) + gain_post.dot(product_post.T)).T
+    frequency = loss.dot(state.T).T
+    assert np.all(gain >= 0)
+    assert np.all(frequency >= 0)
+    # gain - loss equals the signed collision operator
+    expected = bp_cp.collision_update_matrix(data, product_pre - product_post)
+    assert np.allclose(data.dt * (gain - state * frequency), expected,
+                       rtol=1e-10, atol=1e-14)
+    return
+
+
+@pytest.mark.parametrize("tf", bp_t.FILES)
+def test_gain_loss_scheme(tf):
+    data = gain_loss_data(tf)
+    affected_points = np.arange(1, data.p_size - 1)
+    # the initial states are in equilibrium, use a random state instead
+    data.state = np.random.random(data.state.shape)
+    initial_state = np.copy(data.state)
+    initial_mass = np.sum(data.state[affected_points], axis=1)
+    # small time steps converge to the euler scheme
+    data.dt = 1e-3 * data.base_dt
+    bp_cp.gain_loss_scheme(data, affected_points)
+    gain_loss_change = data.state - initial_state
+    data.state[...] = initial_state
+    bp_cp.euler_scheme(data, affected_points)
+    euler_change = data.state - initial_state
+    assert np.allclose(gain_loss_change, euler_change,
+                       rtol=0, atol=1e-2 * np.max(np.abs(euler_change)))
+    # large time steps keep the state non-negative
+    data.state[...] = initial_state
+    data.dt = 1e3 * data.base_dt
+    bp_cp.gain_loss_scheme(data, affected_points)
+    assert np.all(data.state >= 0)
+    assert np.all(np.isfinite(data.state))
+    assert np.allclose(np.sum(data.state[affected_points], axis=1),
+                       initial_mass,
+                       rtol=0.5)
+    return
+
+
+def test_gain_loss_computation(tmp_path):
+    tc = bp_t.CASES[0]
+    sim = _make_case(tc, tmp_path, "gain_loss",
+                     Collisions_Computation="GainLoss_SemiImplicit")
+    sim.compute()
+    _assert_results_equal(_results(sim.file_address),
+                          _results(tc.file_address),
+                          rtol=1e-2,
+                          atol=1e-3)
+    return
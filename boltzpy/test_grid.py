@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+import boltzpy.testcase as bp_t
+
+
+@pytest.mark.parametrize("tc", bp_t.CASES)
+def test_get_index_finds_all_grid_points(tc):
+    for (idx_G, G) in enumerate(tc.sv.vGrids):
+        indices = G.get_indices(G.iG)
+        assert np.array_equal(indices, np.arange(G.size))
+        for (idx_v, v) in enumerate(G.iG):
+            assert G.get_index(v) == idx_v
+        [beg, end] = tc.sv.index_range[idx_G]
+        global_indices = tc.sv.find_indices(idx_G, G.iG)
+        assert np.array_equal(global_indices, np.arange(beg, end))
+    return
+
+
+@pytest.mark.parametrize("tc", bp_t.CASES)
+def test_get_index_of_non_grid_points(tc):
+    for (idx_G, G) in enumerate(tc.sv.vGrids):
+        # values between grid points
+        values = G.iG + 1
+        assert np.all(G.get_indices(values) == -1)
+        assert G.get_index(values[0]) is None
+        # values outside of the grid
+        values = G.iG + G.spacing * np.array(G.shape)
+        assert np.all(G.get_indices(values) == -1)
+        assert np.all(tc.sv.find_indices(idx_G, values) == -1)
+        assert tc.sv.find_index(idx_G, values[0]) is None
+    return
@@ -153,3 +153,47 @@ def test_energy_flow(tf):
                                           velocities,
                                           mass)
             assert np.array_equal(old_result, new_result)
+
+
+@pytest.mark.parametrize("tf", bp_t.FILES)
+def test_moments_equal_separate_functions(tf):
+    simulation = bp.Simulation.load(tf)
+    # load results
+    hdf_file = h5py.File(tf, mode="r")
+    hdf_group = hdf_file["results"]
+    for (s, species_name) in enumerate(simulation.s.names):
+        dv = simulation.sv.vGrids[s].physical_spacing
+        mass = simulation.s.mass[s]
+        velocities = simulation.sv.vGrids[s].pG
+        matrix = bp_o.moment_matrix(dv, velocities, mass)
+        spc_group = hdf_group[species_name]
+        for t in range(simulation.t.size):
+            state = spc_group["state"][t]
+            moments = bp_o.moments(state, matrix, mass)
+            particle_number = bp_o.particle_number(state, dv)
+            mean_velocity = bp_o.mean_velocity(state,
+                                               dv,
+                                               velocities,
+                                               particle_number)
+            expected = {
+                "particle_number": particle_number,
+                "mean_velocity": mean_velocity,
+                "temperature": bp_o.temperature(state,
+                                                dv,
+                                                velocities,
+                                                mass,
+                                                particle_number,
+                                                mean_velocity),
+                "momentum": bp_o.momentum(state, dv, velocities, mass),
+                "momentum_flow": bp_o.momentum_flow(state,
+                                                    dv,
+                                                    velocities,
+                                                    mass),
+                "energy": bp_o.energy(state, dv, velocities, mass),
+                "energy_flow": bp_o.energy_flow(state, dv, velocities, mass)
+            }
+            assert set(moments.keys()) == set(expected.keys())
+            for (name, value) in expected.items():
+                assert moments[name].shape == value.shape
+                assert np.allclose(moments[name], value,
+                                   rtol=1e-12, atol=1e-12)
@@ -116,7 +116,11 @@ class TestCase(bp.Simulation):
 
         if coll is None:
             coll = bp.Collisions()
-            coll.setup(scheme=self.scheme, svgrid=self.sv, species=self.s)
+            # never use cached collisions in tests
+            coll.setup(scheme=self.scheme,
+                       svgrid=self.sv,
+                       species=self.s,
+                       use_cache=False)
         self.coll = coll
         return
 